@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.urls import include, path, re_path
+from recipes import async_views
 from recipes.views import IngredientViewSet, RecipeViewSet, TagViewSet
 from rest_framework.routers import DefaultRouter
 from users.views import CustomUserViewSet, SubscriptionViewSet
 
+from .views import db_pool_stats
+
 router_v1 = DefaultRouter()
 router_v1.register(r'users', CustomUserViewSet)
 router_v1.register(r'tags', TagViewSet)
@@ -15,4 +19,13 @@ urlpatterns = [
         {'post': 'create', 'delete': 'destroy'}
     )),
     path('auth/', include('djoser.urls.authtoken')),
+    path('db-pool-stats/', db_pool_stats),
 ]
+
+if settings.ASYNC_VIEWS:
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+        path('tags/', async_views.tag_list),
+        path('ingredients/', async_views.ingredient_list),
+    ] + urlpatterns
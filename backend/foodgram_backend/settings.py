@@ -9,8 +9,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'no_key')
 
+SHORT_LINK_KEY = os.getenv('SHORT_LINK_KEY', SECRET_KEY)
+
 DEBUG = os.getenv('DEBUG', 'false').lower() == 'true'
 
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'false').lower() == 'true'
+
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '127.0.0.1 localhost').split()
 
 CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', '127.0.0.1 localhost').split()
@@ -40,6 +44,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'utils.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,10 +76,42 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Постоянные соединения: одно на поток воркера, пересоздаётся
+        # через DB_CONN_MAX_AGE секунд и проверяется перед запросом.
+        # Под ASGI соединения не переиспользуются между запросами,
+        # поэтому там по умолчанию закрываются сразу.
+        'CONN_MAX_AGE': int(os.getenv(
+            'DB_CONN_MAX_AGE', 0 if ASYNC_VIEWS else 60
+        )),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+        },
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS="хост[:порт] ...", остальные
+# параметры - как у основной базы. Для проверки локально можно указать
+# хост основной базы: алиас реплики будет вторым соединением к ней же.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(os.getenv('DB_REPLICA_HOSTS', '').split(), 1):
+    host, _, port = replica.partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['utils.db_router.ReplicaRouter']
+
+# Сколько секунд после записи пользователь читает из основной базы
+DATABASE_PRIMARY_STICKY_SECONDS = int(
+    os.getenv('DB_PRIMARY_STICKY_SECONDS', 10)
+)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -2,12 +2,14 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
-from short_url.views import RedirectUrl
+from short_url.views import aredirect_short_link, redirect_short_link
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('s/<str:slug>/', RedirectUrl.as_view())
+    path('s/<str:slug>/', (
+        aredirect_short_link if settings.ASYNC_VIEWS else redirect_short_link
+    )),
 
 ]
 
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
 
 application = get_wsgi_application()
+
+from django.db import connections  # noqa: E402
+from recipes.ingredient_index import ingredient_index  # noqa: E402
+from recipes.pantry_index import pantry_index  # noqa: E402
+
+ingredient_index.warm_up()
+pantry_index.warm_up()
+# Соединение прогрева не должно достаться воркерам gunicorn при --preload
+connections.close_all()
@@ -1,7 +1,21 @@
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import Q
 
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient, RecipeTag,
                      ShoppingCart, Tag)
+from .pantry_index import recipes_changed
+from .shopping_list import refresh_for_recipes
+from .similarity import index_recipes
+from .tag_masks import update_masks
+
+
+def ingredients_changed(recipe_ids):
+    """Обновляет производные данные после правки ингредиентов в админке"""
+    refresh_for_recipes(recipe_ids)
+    recipes_changed(recipe_ids)
+    transaction.on_commit(lambda: index_recipes(recipe_ids))
+
 
 admin.site.empty_value_display = 'Не задано'
 
@@ -23,14 +37,13 @@ class IngredientAdmin(admin.ModelAdmin):
         'name',
         'measurement_unit'
     )
-    search_fields = ('name',)
+    search_fields = ('^name',)
 
 
 class RecipeAdmin(admin.ModelAdmin):
 
     def _favorite_count(self, obj):
-        counter = Favorite.objects.filter(recipe=obj.pk).count()
-        return f'{counter} чел.'
+        return f'{obj.favorites_count} чел.'
 
     _favorite_count.short_description = 'В избранном у'
 
@@ -43,14 +56,62 @@ class RecipeAdmin(admin.ModelAdmin):
     list_display = (
         'name',
         'author',
+        'favorites_count',
+        'carts_count',
+        'popularity',
     )
     search_fields = ('author__username', 'name')
     list_filter = ('tags',)
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.filter(
+            Q(pk__in=Recipe.objects.search(search_term).values('pk'))
+            | Q(author__username__icontains=search_term)
+        ), False
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        ingredients_changed([form.instance.pk])
+        update_masks(Recipe.objects.filter(pk=form.instance.pk))
+
+
+class RecipeIngredientAdmin(admin.ModelAdmin):
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        ingredients_changed([obj.recipe_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ingredients_changed([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = list(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        ingredients_changed(recipe_ids)
+
+
+class RecipeTagAdmin(admin.ModelAdmin):
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        update_masks(Recipe.objects.filter(pk=obj.recipe_id))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        update_masks(Recipe.objects.filter(pk=obj.recipe_id))
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = list(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        update_masks(Recipe.objects.filter(pk__in=recipe_ids))
+
 
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Tag)
 admin.site.register(ShoppingCart)
 admin.site.register(Favorite)
-admin.site.register(RecipeIngredient)
-admin.site.register(RecipeTag)
+admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
+admin.site.register(RecipeTag, RecipeTagAdmin)
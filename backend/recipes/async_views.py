@@ -0,0 +1,126 @@
+"""
+Асинхронные версии горячих представлений для чтения (ASGI).
+
+Подключаются вместо маршрутов DRF при ASYNC_VIEWS = True
+(см. api.urls); запись и неподдерживаемые варианты запросов
+(курсорная пагинация, ошибки валидации) обслуживают синхронные
+представления DRF.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from utils.async_views import with_sync_fallback
+
+from .filters import RecipeFilter
+from .ingredient_index import ingredient_index
+from .models import Recipe, Tag
+from .pagination import RecipePageNumberLimit
+from .reference import INGREDIENTS, TAGS, asnapshot_response
+from .serializers import (IngredientSearchSerializer, OutputRecipeSerializer,
+                          TagSerializer)
+from .user_recipes import user_recipe_ids
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+CURSOR_PARAM = (
+    RecipePageNumberLimit.cursor_pagination_class.cursor_query_param
+)
+
+
+def json_response(data):
+    """JSON в том же виде, что у JSONRenderer DRF"""
+    return JsonResponse(data, safe=False, json_dumps_params={
+        'ensure_ascii': False, 'separators': (',', ':')
+    })
+
+
+@with_sync_fallback(TagViewSet.as_view({'get': 'list'}))
+async def tag_list(request):
+    return await asnapshot_response(
+        request, TAGS,
+        lambda: TagSerializer(Tag.objects.order_by('id'), many=True).data
+    )
+
+
+@with_sync_fallback(IngredientViewSet.as_view({'get': 'list'}))
+async def ingredient_list(request):
+    params = IngredientSearchSerializer(data=request.GET)
+    if not params.is_valid():
+        return None
+    params = params.validated_data
+    return await asnapshot_response(
+        request, INGREDIENTS,
+        lambda: ingredient_index.search(**params),
+        (params['name'].lower(), params['limit'], params['words'])
+    )
+
+
+def filter_recipes(request):
+    """Queryset рецептов с фильтрами запроса или None при ошибке"""
+    filterset = RecipeFilter(
+        request.GET,
+        queryset=Recipe.objects.with_user_flags(request.user).for_output(),
+        request=request
+    )
+    if not filterset.is_valid():
+        return None
+    return filterset.qs
+
+
+@with_sync_fallback(RecipeViewSet.as_view(
+    {'get': 'list', 'post': 'create'}, basename='recipes', detail=False
+))
+async def recipe_list(request):
+    if CURSOR_PARAM in request.GET:
+        return None
+    try:
+        page = int(request.GET.get('page', 1))
+        limit = int(
+            request.GET.get('limit', RecipePageNumberLimit.page_size)
+        )
+    except ValueError:
+        return None
+    if page < 1 or limit < 1:
+        return None
+    await user_recipe_ids.afor_request(request)
+    queryset = await sync_to_async(filter_recipes)(request)
+    if queryset is None:
+        return None
+    count = await queryset.acount()
+    offset = (page - 1) * limit
+    if page > 1 and offset >= count:
+        return None
+    recipes = [
+        recipe async for recipe in queryset[offset:offset + limit]
+    ]
+    url = request.build_absolute_uri()
+    previous = None
+    if page == 2:
+        previous = remove_query_param(url, 'page')
+    elif page > 2:
+        previous = replace_query_param(url, 'page', page - 1)
+    return json_response({
+        'count': count,
+        'next': (replace_query_param(url, 'page', page + 1)
+                 if offset + limit < count else None),
+        'previous': previous,
+        'results': OutputRecipeSerializer(
+            recipes, many=True, context={'request': request}
+        ).data,
+    })
+
+
+@with_sync_fallback(RecipeViewSet.as_view(
+    {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+     'delete': 'destroy'},
+    basename='recipes', detail=True
+))
+async def recipe_detail(request, pk):
+    recipe = await Recipe.objects.with_user_flags(
+        request.user
+    ).for_output().filter(pk=pk).afirst()
+    if recipe is None:
+        return None
+    await user_recipe_ids.afor_request(request)
+    return json_response(
+        OutputRecipeSerializer(recipe, context={'request': request}).data
+    )
@@ -0,0 +1,123 @@
+"""
+Лента рецептов авторов, на которых подписан пользователь.
+
+Новый рецепт раскладывается по лентам подписчиков (TimelineEntry)
+пачками после фиксации транзакции. Ленты, выросшие больше
+FEED_TIMELINE_LENGTH записей, обрезает периодическая команда
+trim_timelines, а не запрос публикации рецепта. Рецепты авторов, у которых
+не меньше FEED_FANOUT_MAX_FOLLOWERS подписчиков, в ленты не пишутся
+и читаются напрямую при запросе ленты (см. FeedCursorPagination).
+"""
+from django.db import transaction
+from django.db.models import Count, Q
+from users.models import CustomUser, Subscription
+from utils.batches import keyset_batches
+from utils.constants import (FEED_FANOUT_BATCH_SIZE,
+                             FEED_FANOUT_MAX_FOLLOWERS, FEED_TIMELINE_LENGTH)
+
+from .models import Recipe, TimelineEntry
+
+
+def is_fanned_out(author_id):
+    """Пишутся ли рецепты автора в ленты подписчиков"""
+    followers_count = CustomUser.objects.filter(
+        pk=author_id
+    ).values_list('followers_count', flat=True).first()
+    return (followers_count or 0) < FEED_FANOUT_MAX_FOLLOWERS
+
+
+def timeline_cutoff(user_id):
+    """
+    Первая лишняя запись ленты пользователя (pub_date, recipe_id),
+    ищется по индексу timeline_user_pub_date_idx
+    """
+    return TimelineEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', 'recipe_id'
+    ).values_list('pub_date', 'recipe_id')[
+        FEED_TIMELINE_LENGTH:FEED_TIMELINE_LENGTH + 1
+    ]
+
+
+def trim_timeline(user_id):
+    """Оставляет в ленте пользователя FEED_TIMELINE_LENGTH записей"""
+    cutoff = list(timeline_cutoff(user_id))
+    if not cutoff:
+        return 0
+    pub_date, recipe_id = cutoff[0]
+    return TimelineEntry.objects.filter(
+        Q(pub_date__lt=pub_date)
+        | Q(pub_date=pub_date, recipe_id__gte=recipe_id),
+        user_id=user_id
+    ).delete()[0]
+
+
+def overgrown_timelines():
+    """Id пользователей с лентами длиннее FEED_TIMELINE_LENGTH записей"""
+    return TimelineEntry.objects.order_by().values('user_id').annotate(
+        entries=Count('pk')
+    ).filter(entries__gt=FEED_TIMELINE_LENGTH).values_list(
+        'user_id', flat=True
+    )
+
+
+def fan_out(recipe_id, author_id, pub_date):
+    """Добавляет рецепт в ленты подписчиков автора пачками"""
+    if not is_fanned_out(author_id):
+        return
+    for user_ids in keyset_batches(
+        Subscription.objects.filter(following_id=author_id),
+        FEED_FANOUT_BATCH_SIZE, 'user_id'
+    ):
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id, recipe_id=recipe_id,
+                    pub_date=pub_date
+                )
+                for user_id in user_ids
+            ),
+            ignore_conflicts=True
+        )
+
+
+@transaction.atomic
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя последние рецепты нового автора"""
+    if not is_fanned_out(author_id):
+        return
+    recipes = Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', 'id'
+    ).values_list('pk', 'pub_date')[:FEED_TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, recipe_id=pk, pub_date=pub_date)
+            for pk, pub_date in recipes
+        ),
+        ignore_conflicts=True
+    )
+    trim_timeline(user_id)
+
+
+def unfollow(user_id, author_id):
+    """Убирает из ленты пользователя рецепты автора"""
+    return TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def feed_sources(user):
+    """
+    Источники ленты: пары (queryset, поле id рецепта), у каждого
+    есть поле pub_date. Первый - записи ленты пользователя, второй -
+    рецепты авторов, читаемых напрямую.
+    """
+    return (
+        (TimelineEntry.objects.filter(user=user), 'recipe_id'),
+        (
+            Recipe.objects.filter(author__in=Subscription.objects.filter(
+                user=user,
+                following__followers_count__gte=FEED_FANOUT_MAX_FOLLOWERS
+            ).values('following_id')),
+            'id'
+        ),
+    )
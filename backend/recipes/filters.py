@@ -1,31 +1,50 @@
-from django_filters.filters import (CharFilter, ModelMultipleChoiceFilter,
-                                    NumberFilter)
+from django_filters.filters import (CharFilter, ChoiceFilter,
+                                    MultipleChoiceFilter, NumberFilter)
 from django_filters.rest_framework import FilterSet
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Recipe
+from recipes.popularity import POPULAR, POPULAR_ORDERING
+from recipes.tag_masks import tag_bits
+from recipes.user_recipes import user_recipe_ids
 
 
 class RecipeFilter(FilterSet):
     """Фильтр для рецптов"""
 
     is_in_shopping_cart = NumberFilter(
-        field_name='is_in_shopping_cart')
+        field_name='is_in_shopping_cart', method='filter_user_recipes')
     is_favorited = NumberFilter(
-        field_name='is_favorited')
+        field_name='is_favorited', method='filter_user_recipes')
     author = NumberFilter(field_name='author__id')
-    tags = ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug')
+    tags = MultipleChoiceFilter(
+        choices=tag_bits.choices,
+        method='filter_tags')
+    search = CharFilter(method='filter_search')
+    ordering = ChoiceFilter(
+        choices=((POPULAR, 'По популярности'),),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
+        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags',
+                  'search', 'ordering')
 
+    def filter_user_recipes(self, queryset, name, value):
+        """Избранное/корзина - по id рецептов пользователя"""
+        favorites, cart = user_recipe_ids.for_request(self.request)
+        ids = favorites if name == 'is_favorited' else cart
+        if value:
+            return queryset.filter(pk__in=ids)
+        return queryset.exclude(pk__in=ids)
 
-class IngridientFilter(FilterSet):
-    """Фильтр по частичному вхождению в начале названия ингредиента('name')"""
-    name = CharFilter(field_name='name', lookup_expr='startswith')
+    def filter_tags(self, queryset, name, value):
+        """Хотя бы один из тегов - по маске тегов рецепта"""
+        return tag_bits.filter(queryset, value)
 
-    class Meta:
-        model = Ingredient
-        fields = ['name']
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск с ранжированием по релевантности"""
+        return queryset.search(value)
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по популярности (индекс recipe_popularity_idx)"""
+        return queryset.order_by(*POPULAR_ORDERING)
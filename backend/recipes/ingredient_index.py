@@ -0,0 +1,97 @@
+"""
+Индекс ингредиентов в памяти воркера для автодополнения.
+
+Названия хранятся в отсортированных массивах (в нижнем регистре),
+поиск по префиксу - bisect. Второй массив содержит хвосты названий,
+начинающиеся с каждого следующего слова, для совпадений по началу слова.
+Индекс перестраивается при смене версии справочника ингредиентов
+(см. recipes.reference).
+"""
+import re
+import threading
+from bisect import bisect_left
+
+from django.db import DatabaseError
+
+from .models import Ingredient
+from .reference import INGREDIENTS, data_versions
+
+WORD_RE = re.compile(r'\w+')
+
+
+class IngredientIndex:
+
+    def __init__(self):
+        self._snapshot = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        version = data_versions.get(INGREDIENTS)
+        items = list(
+            Ingredient.objects.order_by('name', 'id')
+            .values('id', 'name', 'measurement_unit')
+        )
+        prefixes, words = [], []
+        for position, item in enumerate(items):
+            name = item['name'].lower()
+            prefixes.append((name, position))
+            words.extend(
+                (name[match.start():], position)
+                for match in WORD_RE.finditer(name) if match.start()
+            )
+        prefixes.sort()
+        words.sort()
+        self._snapshot = (
+            items,
+            [key for key, _ in prefixes], [pos for _, pos in prefixes],
+            [key for key, _ in words], [pos for _, pos in words],
+        )
+        self._version = version
+        return self._snapshot
+
+    def warm_up(self):
+        """Строит индекс при старте воркера, если база уже доступна"""
+        try:
+            self.build()
+        except DatabaseError:
+            self._snapshot = None
+
+    def get_snapshot(self):
+        snapshot = self._snapshot
+        if (snapshot is None
+                or self._version != data_versions.get(INGREDIENTS)):
+            with self._lock:
+                snapshot = self._snapshot
+                if (snapshot is None
+                        or self._version != data_versions.get(INGREDIENTS)):
+                    snapshot = self.build()
+        return snapshot
+
+    @staticmethod
+    def _scan(keys, positions, query, limit, found):
+        index = bisect_left(keys, query)
+        while (index < len(keys) and len(found) < limit
+               and keys[index].startswith(query)):
+            found.setdefault(positions[index], None)
+            index += 1
+
+    def search(self, name='', limit=None, words=False):
+        """
+        Возвращает до limit ингредиентов, название которых начинается
+        с name (без учёта регистра); при words=True затем добавляются
+        совпадения по началу любого слова в названии.
+        """
+        items, keys, positions, word_keys, word_positions = (
+            self.get_snapshot()
+        )
+        query = name.lower()
+        limit = len(items) if limit is None else limit
+        found = {}
+        self._scan(keys, positions, query, limit, found)
+        if words and query:
+            self._scan(word_keys, word_positions, query, limit, found)
+        return [items[position] for position in found]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,132 @@
+import http.client
+import threading
+from time import monotonic, perf_counter
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import Ingredient, Recipe
+from short_url.codes import encode
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Command(BaseCommand):
+    help = """Нагрузочное сравнение горячих запросов на чтение у нескольких
+    развёртываний (например, gunicorn sync и gunicorn + uvicorn с
+    ASYNC_VIEWS=true) на одних и тех же данных: пропускная способность,
+    p50 и p99 для каждого уровня параллельности.
+    Пример: benchmark_reads --target sync=http://backend:8000
+    --target async=http://backend-async:8000 --concurrency 1 8 32"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True,
+            help='имя=базовый адрес развёртывания, можно несколько'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 8, 32],
+            help='уровни параллельности (число потоков-клиентов)'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='длительность одного замера, секунд'
+        )
+        parser.add_argument(
+            '--token', default='',
+            help='токен пользователя для заголовка Authorization'
+        )
+
+    def get_paths(self):
+        """Запросы для замера - по данным той же базы, что у целей"""
+        recipe = Recipe.objects.order_by('-pub_date', 'id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        if recipe is None or ingredient is None:
+            raise CommandError('Нет рецептов или ингредиентов для замера')
+        return (
+            '/api/recipes/',
+            '/api/recipes/?page=2&limit=6',
+            f'/api/recipes/{recipe.pk}/',
+            '/api/tags/',
+            f'/api/ingredients/?name={quote(ingredient.name[:1])}',
+            f'/s/{encode(recipe.pk)}/',
+        )
+
+    def measure(self, base_url, path, concurrency, duration, headers):
+        """Возвращает (запросов в секунду, p50, p99 в мс, ошибок)"""
+        url = urlsplit(base_url)
+        connection_class = (http.client.HTTPSConnection
+                            if url.scheme == 'https'
+                            else http.client.HTTPConnection)
+        request_path = url.path.rstrip('/') + path
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+        deadline = monotonic() + duration
+
+        def worker():
+            connection = connection_class(url.netloc, timeout=30)
+            local = []
+            failed = 0
+            while monotonic() < deadline:
+                started = perf_counter()
+                try:
+                    connection.request('GET', request_path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status >= 400:
+                        failed += 1
+                except (OSError, http.client.HTTPException):
+                    failed += 1
+                    connection.close()
+                    connection = connection_class(url.netloc, timeout=30)
+                    continue
+                local.append(perf_counter() - started)
+            connection.close()
+            with lock:
+                latencies.extend(local)
+                errors[0] += failed
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(concurrency)]
+        started = monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = monotonic() - started
+        if not latencies:
+            return 0, 0, 0, errors[0]
+        latencies.sort()
+        return (
+            len(latencies) / elapsed,
+            percentile(latencies, 0.5) * 1000,
+            percentile(latencies, 0.99) * 1000,
+            errors[0],
+        )
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, separator, base_url = target.partition('=')
+            if not separator or not base_url:
+                raise CommandError(f'Ожидается имя=адрес: {target}')
+            targets.append((name, base_url))
+        headers = {'Accept-Encoding': 'gzip'}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        self.stdout.write(
+            f'{"запрос":<40} {"цель":<10} {"пот.":>5} {"RPS":>9} '
+            f'{"p50, мс":>9} {"p99, мс":>9} {"ошибок":>7}'
+        )
+        for path in self.get_paths():
+            for concurrency in options['concurrency']:
+                for name, base_url in targets:
+                    rps, p50, p99, errors = self.measure(
+                        base_url, path, concurrency,
+                        options['duration'], headers
+                    )
+                    self.stdout.write(
+                        f'{path[:40]:<40} {name:<10} {concurrency:>5} '
+                        f'{rps:>9.1f} {p50:>9.2f} {p99:>9.2f} {errors:>7}'
+                    )
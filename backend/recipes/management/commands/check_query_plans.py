@@ -0,0 +1,240 @@
+import random
+import re
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.feed import timeline_cutoff
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag, TimelineEntry)
+from recipes.pagination import (POPULAR_KEY, date_key, keyset_filter,
+                                keyset_ordering)
+from recipes.popularity import POPULAR_ORDERING
+from recipes.tag_masks import assign_bits, tag_bits, update_masks
+from recipes.user_recipes import user_recipe_ids
+from users.models import CustomUser, Subscription
+from utils.constants import FEED_FANOUT_BATCH_SIZE
+
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+# Небольшие справочники, присоединённые к запросу, можно читать целиком
+SMALL_TABLES = {Tag._meta.db_table, Ingredient._meta.db_table}
+CYRILLIC = 'абвгдежзиклмнопрстуфхцчшщэюя'
+
+
+def explain(queryset):
+    """
+    План запроса. QuerySet.explain() в Django 4.2 не справляется
+    с запросами-обёртками (фильтр по оконной функции).
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN {sql}', params)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+class Command(BaseCommand):
+    help = """Проверяет планы (EXPLAIN) горячих запросов рецептов, подписок
+    и ленты и завершается с ошибкой, если какой-то из них читает таблицу
+    последовательным сканированием (Seq Scan). С --seed N запросы
+    проверяются на синтетических данных (N рецептов), которые создаются
+    в транзакции и откатываются после проверки. Только PostgreSQL.
+    -v 2 выводит планы всех запросов"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='сколько рецептов создать для проверки (0 - текущие данные)'
+        )
+
+    def seed(self, recipes_count):
+        """Синтетические данные с пропорциями реальных"""
+        stamp = uuid4().hex[:8]
+        users = CustomUser.objects.bulk_create(
+            CustomUser(
+                email=f'seed-{stamp}-{number}@example.com',
+                username=f'seed-{stamp}-{number}',
+                first_name='Seed', last_name='Seed', password='!'
+            )
+            for number in range(max(recipes_count // 2, 10))
+        )
+        authors = users[:max(len(users) // 10, 10)]
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(
+                name=''.join(random.choices(CYRILLIC, k=6)) + str(number),
+                measurement_unit='г'
+            )
+            for number in range(2000)
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'seed-{stamp}-{number}', slug=f'seed-{stamp}-{number}')
+            for number in range(3)
+        )
+        recipes = Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=random.choice(authors),
+                    name=f'seed-{stamp}-{number}', text='Описание',
+                    cooking_time=10, image='recipes/images/seed.png'
+                )
+                for number in range(recipes_count)
+            ),
+            batch_size=5000
+        )
+        table = connection.ops.quote_name(Recipe._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET pub_date = pub_date - '
+                f"random() * INTERVAL '365 days', popularity = random() * 100 "
+                f'WHERE id >= %s',
+                [recipes[0].pk]
+            )
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=100)
+                for recipe in recipes
+                for ingredient in random.sample(ingredients, 5)
+            ),
+            batch_size=5000
+        )
+        RecipeTag.objects.bulk_create(
+            (RecipeTag(recipe=recipe, tag=random.choice(tags))
+             for recipe in recipes),
+            batch_size=5000
+        )
+        assign_bits()
+        update_masks(Recipe.objects.filter(pk__gte=recipes[0].pk))
+        for model, per_user in ((Favorite, 20), (ShoppingCart, 5)):
+            model.objects.bulk_create(
+                (
+                    model(user=user, recipe=recipe)
+                    for user in users
+                    for recipe in random.sample(recipes, per_user)
+                ),
+                batch_size=5000
+            )
+        Subscription.objects.bulk_create(
+            (
+                Subscription(user=user, following=following)
+                for user in users
+                for following in random.sample(authors, 10)
+                if following != user
+            ),
+            batch_size=5000
+        )
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(user=user, recipe=recipe,
+                              pub_date=recipe.pub_date)
+                for user in users
+                for recipe in random.sample(recipes, 50)
+            ),
+            batch_size=5000
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def hot_queries(self):
+        """Пары (название, queryset) в том виде, как их строят views"""
+        subscription = Subscription.objects.order_by('id').first()
+        recipe = Recipe.objects.order_by('-pub_date', 'id')[100:101].first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        tag = Tag.objects.exclude(bit=None).order_by('id').first()
+        if None in (subscription, recipe, ingredient, tag):
+            raise CommandError(
+                'Недостаточно данных для проверки, используйте --seed'
+            )
+        user = subscription.user
+        author_ids = list(
+            Subscription.objects.filter(user=user).values_list(
+                'following_id', flat=True
+            )
+        )
+        page_ids = list(
+            Recipe.objects.values_list('id', flat=True)[:6]
+        )
+        favorites, cart = user_recipe_ids.get(user)
+        recipes = Recipe.objects.with_user_flags(user)
+        return (
+            ('рецепты: список', recipes[:6]),
+            ('рецепты: автор',
+             recipes.filter(author_id=subscription.following_id)[:6]),
+            ('рецепты: теги',
+             tag_bits.filter(recipes, [tag.slug])[:6]),
+            ('рецепты: избранное', recipes.filter(pk__in=favorites)[:6]),
+            ('рецепты: корзина', recipes.filter(pk__in=cart)[:6]),
+            ('избранное пользователя', Favorite.objects.filter(
+                user=user
+            ).order_by('recipe_id').values_list('recipe_id', flat=True)),
+            ('рецепты: по популярности',
+             recipes.order_by(*POPULAR_ORDERING)[:6]),
+            ('рецепты: курсор', recipes.filter(
+                keyset_filter((recipe.pub_date, recipe.pk), False)
+            ).order_by(*keyset_ordering(False))[:7]),
+            ('рецепты: курсор по популярности', recipes.filter(
+                keyset_filter((recipe.popularity, recipe.pk), False,
+                              POPULAR_KEY)
+            ).order_by(*keyset_ordering(False, POPULAR_KEY))[:7]),
+            ('рецепты: ингредиенты страницы',
+             RecipeIngredient.objects.filter(
+                 recipe_id__in=page_ids
+             ).select_related('ingredient')),
+            ('рецепты: теги страницы',
+             RecipeTag.objects.filter(recipe_id__in=page_ids)),
+            ('подписки: список',
+             Subscription.objects.filter(user=user).select_related(
+                 'following'
+             ).order_by('id')[:6]),
+            ('подписки: рецепты авторов',
+             Recipe.objects.latest_per_author(3).filter(
+                 author_id__in=author_ids
+             )),
+            ('подписки: is_subscribed', Subscription.objects.filter(
+                user=user, following_id__in=author_ids
+            )),
+            ('подписки: подписчики автора', Subscription.objects.filter(
+                following_id=subscription.following_id, user_id__gt=0
+            ).order_by('user_id')[:FEED_FANOUT_BATCH_SIZE]),
+            ('лента', TimelineEntry.objects.filter(user=user).order_by(
+                *keyset_ordering(False, date_key('recipe_id'))
+            )[:7]),
+            ('лента: граница обрезки', timeline_cutoff(user.pk)),
+            ('ингредиенты: по началу названия',
+             Ingredient.objects.filter(
+                 name__istartswith=ingredient.name[:3]
+             )[:10]),
+        )
+
+    def check_plans(self):
+        failed = []
+        for name, queryset in self.hot_queries():
+            plan = explain(queryset)
+            scanned = set(SEQ_SCAN.findall(plan)) - (
+                SMALL_TABLES - {queryset.model._meta.db_table}
+            )
+            if scanned:
+                failed.append(name)
+            self.stdout.write(
+                f'{name:<40} '
+                + (f'Seq Scan: {", ".join(sorted(scanned))}'
+                   if scanned else 'OK')
+            )
+            if self.verbosity > 1:
+                self.stdout.write(plan + '\n')
+        if failed:
+            raise CommandError(
+                f'Последовательное сканирование в запросах: '
+                f'{", ".join(failed)}'
+            )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Планы проверяются только в PostgreSQL')
+        self.verbosity = options['verbosity']
+        if not options['seed']:
+            self.check_plans()
+            return
+        with transaction.atomic():
+            self.seed(options['seed'])
+            self.check_plans()
+            transaction.set_rollback(True)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import Recipe
+from recipes.popularity import decay_popularity
+from utils.batches import keyset_batches
+from utils.constants import POPULARITY_HALF_LIFE_HOURS
+
+
+class Command(BaseCommand):
+    help = """Уменьшает популярность рецептов с учётом прошедшего времени.
+    Запускается периодически (например, раз в час по cron)"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=float, default=1,
+            help='сколько часов прошло с предыдущего запуска'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='количество рецептов в одной пачке'
+        )
+
+    def handle(self, *args, **options):
+        if options['hours'] <= 0:
+            raise CommandError('--hours должно быть больше нуля')
+        factor = 0.5 ** (options['hours'] / POPULARITY_HALF_LIFE_HOURS)
+        batch_size = options['batch_size']
+        decayed = 0
+        for pks in keyset_batches(
+            Recipe.objects.filter(popularity__gt=0), batch_size
+        ):
+            decayed += decay_popularity(pks, factor)
+        self.stdout.write(
+            f'Коэффициент {factor:.4f}, обновлено рецептов: {decayed}'
+        )
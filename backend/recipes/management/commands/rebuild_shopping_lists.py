@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import ShoppingCart, ShoppingCartIngredient
+from recipes.shopping_list import (live_shopping_list, refresh_shopping_lists,
+                                   stored_shopping_list)
+
+
+class Command(BaseCommand):
+    help = """Пересчитывает материализованные списки покупок
+    и сверяет их с корзинами пользователей"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='только сверить, не пересчитывая'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='количество пользователей в одной пачке'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = sorted(
+            set(ShoppingCart.objects.values_list('user_id', flat=True))
+            | set(ShoppingCartIngredient.objects.values_list(
+                'user_id', flat=True
+            ))
+        )
+        mismatched = []
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            if not options['check']:
+                refresh_shopping_lists(batch)
+            stored = stored_shopping_list(batch)
+            live = live_shopping_list(batch)
+            mismatched += [
+                user_id for user_id in batch
+                if stored[user_id] != live[user_id]
+            ]
+
+        self.stdout.write(
+            f'Проверено пользователей: {len(user_ids)}, '
+            f'расхождений: {len(mismatched)}'
+        )
+        if mismatched:
+            raise CommandError(
+                f'Списки покупок расходятся с корзинами: {mismatched[:20]}'
+            )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+from recipes.similarity import index_recipes
+from utils.batches import keyset_batches
+
+
+class Command(BaseCommand):
+    help = """Пересчитывает LSH-корзины похожих рецептов пачками"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='количество рецептов в одной пачке'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        indexed = 0
+        for pks in keyset_batches(Recipe.objects.all(), batch_size):
+            index_recipes(pks)
+            indexed += len(pks)
+        self.stdout.write(f'Проиндексировано рецептов: {indexed}')
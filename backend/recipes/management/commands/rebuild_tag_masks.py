@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe, Tag
+from recipes.tag_masks import assign_bits, update_masks
+from utils.batches import keyset_batches
+
+
+class Command(BaseCommand):
+    help = """Назначает биты тегам без бита и пересчитывает маски тегов
+    всех рецептов пачками. Запускается после загрузки тегов и рецептов
+    в обход ORM (loaddata, import_json) или массового удаления тегов"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='количество рецептов в одной пачке'
+        )
+
+    def handle(self, *args, **options):
+        assigned = assign_bits()
+        without_bit = Tag.objects.filter(bit=None).count()
+        if without_bit:
+            self.stderr.write(
+                f'Тегов без бита (все биты заняты): {without_bit}, '
+                f'фильтр по ним работает через RecipeTag'
+            )
+        batch_size = options['batch_size']
+        updated = 0
+        for pks in keyset_batches(Recipe.objects.all(), batch_size):
+            updated += update_masks(Recipe.objects.filter(pk__in=pks))
+        self.stdout.write(
+            f'Назначено битов: {assigned}, пересчитано рецептов: {updated}'
+        )
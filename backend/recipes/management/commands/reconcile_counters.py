@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import CustomUser, Subscription
+from utils.batches import keyset_batches
+from utils.counters import count_subquery
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'carts_count', ShoppingCart, 'recipe'),
+    (CustomUser, 'recipes_count', Recipe, 'author'),
+    (CustomUser, 'followers_count', Subscription, 'following'),
+)
+
+
+class Command(BaseCommand):
+    help = """Сверяет денормализованные счётчики с фактическими
+    значениями и исправляет расхождения пачками"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='количество объектов в одной пачке'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, field, related_model, related_field in COUNTERS:
+            actual = count_subquery(related_model, related_field)
+            fixed = 0
+            for pks in keyset_batches(model.objects.all(), batch_size):
+                with transaction.atomic():
+                    drifted = list(
+                        model.objects.filter(pk__in=pks)
+                        .alias(actual=actual)
+                        .exclude(**{field: F('actual')})
+                        .values_list('pk', flat=True)
+                    )
+                    if drifted:
+                        fixed += model.objects.filter(
+                            pk__in=drifted
+                        ).update(**{field: actual})
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}.{field}: '
+                f'исправлено {fixed}'
+            )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from recipes.feed import overgrown_timelines, trim_timeline
+
+
+class Command(BaseCommand):
+    help = """Обрезает ленты подписок до FEED_TIMELINE_LENGTH записей.
+    Запускается периодически (например, раз в час по cron)"""
+
+    def handle(self, *args, **options):
+        trimmed = deleted = 0
+        for user_id in list(overgrown_timelines()):
+            deleted += trim_timeline(user_id)
+            trimmed += 1
+        self.stdout.write(
+            f'Обрезано лент: {trimmed}, удалено записей: {deleted}'
+        )
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:08
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from recipes.similarity import recipe_buckets
+
+
+def fill_buckets(apps, schema_editor):
+    RecipeBucket = apps.get_model('recipes', 'RecipeBucket')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ingredients = defaultdict(set)
+    for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+        'recipe_id', 'ingredient_id'
+    ).iterator():
+        ingredients[recipe_id].add(ingredient_id)
+    RecipeBucket.objects.bulk_create(
+        (
+            RecipeBucket(recipe_id=recipe_id, bucket=bucket)
+            for recipe_id, ingredient_ids in ingredients.items()
+            for bucket in recipe_buckets(ingredient_ids)
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True, verbose_name='Корзина')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'LSH-корзина рецепта',
+                'verbose_name_plural': 'LSH-корзины рецептов',
+                'default_related_name': 'buckets',
+            },
+        ),
+        migrations.RunPython(fill_buckets, migrations.RunPython.noop),
+    ]
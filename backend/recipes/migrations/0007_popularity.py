@@ -0,0 +1,35 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:11
+
+from django.db import migrations, models
+from utils.constants import CART_POPULARITY_WEIGHT, FAVORITE_POPULARITY_WEIGHT
+
+
+def fill_popularity(apps, schema_editor):
+    """Начальная популярность - по текущим счётчикам, без затухания"""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(
+        popularity=(
+            models.F('favorites_count') * FAVORITE_POPULARITY_WEIGHT
+            + models.F('carts_count') * CART_POPULARITY_WEIGHT
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipebucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(models.OrderBy(models.F('popularity'), descending=True), models.F('id'), name='recipe_popularity_idx'),
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:31
+
+from django.db import migrations, models
+
+
+def create_ingredient_prefix_index(apps, schema_editor):
+    """
+    Индекс для поиска по началу названия без учёта регистра
+    (name__istartswith: UPPER(name) LIKE UPPER('...%')) - только
+    в PostgreSQL; text_pattern_ops нужен для LIKE при любой локали.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX recipes_ingredient_name_upper_idx '
+        'ON recipes_ingredient (UPPER(name) text_pattern_ops)'
+    )
+
+
+def drop_ingredient_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_name_upper_idx'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(models.OrderBy(models.F('pub_date'), descending=True), models.F('id'), name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(models.F('author'), models.OrderBy(models.F('pub_date'), descending=True), models.F('id'), name='recipe_author_pub_date_idx'),
+        ),
+        migrations.RunPython(
+            create_ingredient_prefix_index, drop_ingredient_prefix_index
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:38
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, Coalesce
+from utils.constants import TAG_MASK_BITS
+
+
+def fill_tags_mask(apps, schema_editor):
+    """Биты существующим тегам по порядку id и маски всех рецептов"""
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeTag = apps.get_model('recipes', 'RecipeTag')
+    for bit, pk in enumerate(
+        Tag.objects.order_by('pk').values_list('pk', flat=True)[
+            :TAG_MASK_BITS
+        ]
+    ):
+        Tag.objects.filter(pk=pk).update(bit=bit)
+    Recipe.objects.update(tags_mask=Coalesce(
+        models.Subquery(
+            RecipeTag.objects.filter(
+                recipe=models.OuterRef('pk')
+            ).values('recipe').annotate(
+                mask=models.Sum(
+                    Cast(models.Value(1), models.BigIntegerField())
+                    .bitleftshift(models.F('tag__bit'))
+                )
+            ).values('mask')
+        ),
+        0,
+        output_field=models.BigIntegerField()
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, unique=True, verbose_name='Бит в маске тегов рецепта'),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,14 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField)
 from django.core.validators import MinValueValidator
-from django.db import models
-from users.models import CustomUser
+from django.db import connections, models
+from django.db.models import (Case, Exists, F, OuterRef, Prefetch, Q, Value,
+                              When, Window)
+from django.db.models.functions import Cast, RowNumber
+from django.utils import timezone
+from utils.constants import SEARCH_CONFIG
+from utils.counters import DenormalizedFieldsMixin
+from users.models import CustomUser, Subscription
 
 
 class UserRecipeModel(models.Model):
@@ -16,6 +24,9 @@ class UserRecipeModel(models.Model):
         'Recipe', verbose_name='Рецепт',
         on_delete=models.CASCADE
     )
+    added_at = models.DateTimeField(
+        'Дата добавления', default=timezone.now, editable=False
+    )
 
     class Meta:
         abstract = True
@@ -39,6 +50,10 @@ class Tag(models.Model):
             'разрешены символы латиницы, цифры, дефис и подчёркивание.'
         )
     )
+    bit = models.PositiveSmallIntegerField(
+        'Бит в маске тегов рецепта', unique=True, null=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'тег'
@@ -70,7 +85,96 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+RECIPE_SEARCH_VECTOR = (
+    SearchVector('name', weight='A', config=SEARCH_CONFIG)
+    + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+)
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов с подготовкой данных для вывода"""
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует флаг is_author_subscribed для пользователя user.
+        Флаги is_favorited и is_in_shopping_cart берутся из id рецептов
+        пользователя (recipes.user_recipes), анонимному - без аннотаций.
+        """
+        if user.is_anonymous:
+            return self
+        return self.annotate(
+            is_author_subscribed=Exists(Subscription.objects.filter(
+                following_id=OuterRef('author_id'), user=user
+            )),
+        )
+
+    def latest_per_author(self, limit=None):
+        """
+        Оставляет не больше limit последних рецептов каждого автора
+        (оконная функция ROW_NUMBER по author_id).
+        """
+        if limit is None:
+            return self
+        return self.annotate(
+            author_row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').asc())
+            )
+        ).filter(author_row_number__lte=limit)
+
+    def search(self, query):
+        """
+        Полнотекстовый поиск по названию и описанию с ранжированием.
+        В PostgreSQL - по search_vector (GIN-индекс), на других базах -
+        icontains, выше рецепты с совпадением в названии.
+        """
+        if connections[self.db].vendor == 'postgresql':
+            search_query = SearchQuery(
+                query, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            # ts_rank возвращает real; double precision точно переносится
+            # в позицию курсора и обратно
+            return self.filter(search_vector=search_query).annotate(
+                search_rank=Cast(
+                    SearchRank(F('search_vector'), search_query),
+                    models.FloatField()
+                )
+            ).order_by('-search_rank', '-pub_date', 'id')
+        return self.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).annotate(
+            search_rank=Case(
+                When(name__icontains=query, then=Value(1.0)),
+                default=Value(0.5)
+            )
+        ).order_by('-search_rank', '-pub_date', 'id')
+
+    def update_search_vector(self):
+        """Пересчитывает search_vector (только PostgreSQL)"""
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=RECIPE_SEARCH_VECTOR)
+
+    def for_output(self):
+        """
+        Подгружает автора, теги и ингредиенты фиксированным
+        числом запросов, независимо от количества рецептов.
+        """
+        return self.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredients_in_recipe',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
+
+
+class Recipe(DenormalizedFieldsMixin, models.Model):
     author = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE,
         verbose_name='Автор'
@@ -100,6 +204,21 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         'Дата публикации рецепта', auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    carts_count = models.PositiveIntegerField(
+        'В корзинах', default=0, editable=False
+    )
+    popularity = models.FloatField(
+        'Популярность', default=0, editable=False
+    )
+    tags_mask = models.BigIntegerField(
+        'Маска тегов', default=0, editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         default_related_name = 'recipes'
@@ -107,11 +226,51 @@ class Recipe(models.Model):
         verbose_name_plural = 'Рецепты'
         ordering = ["-pub_date", "id"]
         unique_together = ('author', 'name')
+        indexes = (
+            models.Index(
+                F('pub_date').desc(), 'id', name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                'author', F('pub_date').desc(), 'id',
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                F('popularity').desc(), 'id', name='recipe_popularity_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
+class TimelineEntry(models.Model):
+    """Запись ленты: рецепт автора, на которого подписан пользователь"""
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    pub_date = models.DateTimeField('Дата публикации рецепта')
+
+    class Meta:
+        default_related_name = 'timeline'
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'Записи лент подписок'
+        unique_together = ('user', 'recipe')
+        indexes = (
+            models.Index(
+                'user', F('pub_date').desc(), 'recipe',
+                name='timeline_user_pub_date_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} <- {self.recipe}'
+
+
 class RecipeTag(models.Model):
     recipe = models.ForeignKey(
         Recipe,
@@ -172,3 +331,83 @@ class ShoppingCart(UserRecipeModel):
         verbose_name_plural = 'Корзина'
         default_related_name = 'shopping_cart'
         unique_together = ('recipe', 'user')
+
+
+class ShoppingCartIngredient(models.Model):
+    """
+    Материализованный список покупок пользователя: суммарное количество
+    каждого ингредиента (а значит и единицы измерения) по всем рецептам
+    корзины. Поддерживается инкрементально, см. recipes.shopping_list.
+    """
+    user = models.ForeignKey(
+        CustomUser, verbose_name='Пользователь',
+        on_delete=models.CASCADE
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, verbose_name='Ингридиент',
+        on_delete=models.CASCADE
+    )
+    amount = models.IntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'ингредиент списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        default_related_name = 'shopping_list'
+        unique_together = ('user', 'ingredient')
+
+    def __str__(self):
+        return f'{self.user} -> {self.ingredient}: {self.amount}'
+
+
+class DataVersion(models.Model):
+    """
+    Номер версии справочных данных (теги, ингредиенты).
+    Увеличивается при любом изменении, по нему воркеры
+    сбрасывают свои снимки и индексы.
+    """
+    name = models.CharField('Набор данных', max_length=32, unique=True)
+    version = models.PositiveBigIntegerField('Версия', default=0)
+
+    class Meta:
+        verbose_name = 'версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+
+class RecipeIngredientsChange(models.Model):
+    """
+    Журнал рецептов с изменённым составом: по нему воркеры обновляют
+    индекс подбора по продуктам только для изменённых рецептов,
+    см. recipes.pantry_index.
+    """
+    id = models.BigAutoField(primary_key=True)
+    recipe_id = models.PositiveBigIntegerField('Id рецепта')
+
+    class Meta:
+        verbose_name = 'изменение состава рецепта'
+        verbose_name_plural = 'Изменения состава рецептов'
+
+    def __str__(self):
+        return f'{self.pk}: {self.recipe_id}'
+
+
+class RecipeBucket(models.Model):
+    """
+    LSH-корзина MinHash-сигнатуры набора ингредиентов рецепта.
+    Рецепты с общей корзиной - кандидаты в похожие, см. recipes.similarity.
+    """
+    recipe = models.ForeignKey(
+        Recipe, verbose_name='Рецепт',
+        on_delete=models.CASCADE
+    )
+    bucket = models.BigIntegerField('Корзина', db_index=True)
+
+    class Meta:
+        verbose_name = 'LSH-корзина рецепта'
+        verbose_name_plural = 'LSH-корзины рецептов'
+        default_related_name = 'buckets'
+
+    def __str__(self):
+        return f'{self.recipe} -> {self.bucket}'
@@ -1,5 +1,190 @@
+from datetime import datetime
+from functools import reduce
+from heapq import merge
+from operator import or_
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
 from utils.pagination import PageNumberAndLimit
 
+from .feed import feed_sources
+from .popularity import POPULAR
+
+
+def date_key(id_field='id'):
+    """Ключ порядка (-pub_date, id)"""
+    return (
+        ('pub_date', True, datetime.fromisoformat),
+        (id_field, False, int),
+    )
+
+
+# Ключ порядка - тройки (поле, по убыванию, разбор значения из курсора)
+DATE_KEY = date_key()
+POPULAR_KEY = (('popularity', True, float), ('id', False, int))
+SEARCH_KEY = (('search_rank', True, float), *DATE_KEY)
+
+
+def keyset_filter(position, reverse, key=DATE_KEY):
+    """Условие "после позиции" (значений полей key) для порядка key"""
+    equal = {}
+    conditions = []
+    for (field, descending, _), value in zip(key, position):
+        lookup = 'lt' if descending != reverse else 'gt'
+        conditions.append(Q(**equal, **{f'{field}__{lookup}': value}))
+        equal[field] = value
+    return reduce(or_, conditions)
+
+
+def keyset_ordering(reverse, key=DATE_KEY):
+    return tuple(
+        f'-{field}' if descending != reverse else field
+        for field, descending, _ in key
+    )
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация рецептов: по (-pub_date, id), при ?ordering=popular -
+    по (-popularity, id), при ?search= - по релевантности
+    (-search_rank, -pub_date, id). Позиция курсора хранит значения ключа
+    последнего рецепта, поэтому выборка страницы не требует
+    ни COUNT(*), ни OFFSET.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', 'id')
+    position_separator = '_'
+
+    def get_key(self, request):
+        """Ключ порядка для параметров запроса"""
+        if request.query_params.get('ordering') == POPULAR:
+            return POPULAR_KEY
+        if request.query_params.get('search', '').strip():
+            return SEARCH_KEY
+        return DATE_KEY
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.key = self.get_key(request)
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        if self.cursor and self.cursor.position is None:
+            self.cursor = None
+        reverse = self.cursor.reverse if self.cursor else False
+        position = (
+            self.decode_position(self.cursor.position) if self.cursor
+            else None
+        )
+        results = self.get_page_items(queryset, position, reverse)
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, bool(self.cursor)
+        return self.page
+
+    def get_page_items(self, queryset, position, reverse):
+        """Возвращает до page_size + 1 рецептов после позиции"""
+        if position is not None:
+            queryset = queryset.filter(
+                keyset_filter(position, reverse, self.key)
+            )
+        return list(queryset.order_by(
+            *keyset_ordering(reverse, self.key)
+        )[:self.page_size + 1])
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self._get_position(self.page[-1])
+        ))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True, position=self._get_position(self.page[0])
+        ))
+
+    def _get_position(self, instance):
+        values = (getattr(instance, field) for field, _, _ in self.key)
+        return self.position_separator.join(
+            value.isoformat() if isinstance(value, datetime) else repr(value)
+            for value in values
+        )
+
+    def decode_position(self, position):
+        """Возвращает значения ключа из позиции курсора"""
+        try:
+            values = position.split(self.position_separator)
+            if len(values) != len(self.key):
+                raise ValueError
+            return tuple(
+                parse(value) for (_, _, parse), value in zip(self.key, values)
+            )
+        except (AttributeError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """
+    Keyset-пагинация ленты подписок. Id рецептов страницы берутся
+    диапазонным чтением из каждого источника ленты (см. recipes.feed)
+    и сливаются по (-pub_date, id), затем рецепты читаются по id.
+    """
+
+    def get_key(self, request):
+        return DATE_KEY
+
+    def get_page_items(self, queryset, position, reverse):
+        sources = []
+        for source, id_field in feed_sources(self.request.user):
+            key = date_key(id_field)
+            if position is not None:
+                source = source.filter(keyset_filter(position, reverse, key))
+            sources.append(list(
+                source.order_by(*keyset_ordering(reverse, key))
+                .values_list('pub_date', id_field)[:self.page_size + 1]
+            ))
+        ids = []
+        for pub_date, pk in merge(
+            *sources, key=lambda row: (row[0], -row[1]), reverse=not reverse
+        ):
+            if pk not in ids:
+                ids.append(pk)
+            if len(ids) > self.page_size:
+                break
+        recipes = queryset.in_bulk(ids)
+        return [recipes[pk] for pk in ids if pk in recipes]
+
 
 class RecipePageNumberLimit(PageNumberAndLimit):
+    """
+    Постраничная пагинация рецептов. При наличии в запросе параметра
+    'cursor' (в том числе пустого) переключается на keyset-пагинацию.
+    """
     page_size = 6
+    cursor_pagination_class = RecipeCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_paginator = self.cursor_pagination_class()
+        if cursor_paginator.cursor_query_param in request.query_params:
+            self.cursor_paginator = cursor_paginator
+            return cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,198 @@
+"""
+Инвертированный индекс "ингредиент -> рецепты" в памяти воркера
+для подбора рецептов по имеющимся продуктам.
+
+Для каждого ингредиента хранится массив id рецептов, для каждого
+рецепта - id его ингредиентов. Покрытие считается подсчётом
+вхождений id по массивам ингредиентов из запроса (Counter.update
+выполняется в C), без GROUP BY по всей таблице RecipeIngredient.
+При смене версии состава рецептов (см. recipes.reference) воркер
+перечитывает только рецепты из журнала RecipeIngredientsChange;
+индекс строится заново, только если воркер отстал от журнала больше
+чем на PANTRY_MAX_INCREMENTAL записей или журнал уже обрезан.
+Транзакции фиксируются не в порядке id журнала, поэтому последние
+PANTRY_CHANGE_WINDOW записей просматриваются повторно и применяются
+те, которых воркер ещё не видел.
+"""
+import threading
+from array import array
+from collections import Counter, defaultdict
+
+from django.db import DatabaseError, transaction
+from utils.constants import (PANTRY_CHANGE_LOG_SIZE, PANTRY_CHANGE_WINDOW,
+                             PANTRY_MAX_INCREMENTAL)
+
+from .models import RecipeIngredient, RecipeIngredientsChange
+from .reference import RECIPE_INGREDIENTS, data_versions
+
+
+def recipes_changed(recipe_ids):
+    """
+    Записывает в журнал рецепты с изменённым составом.
+    Версия увеличивается после фиксации отдельным UPDATE, чтобы строка
+    версии не блокировалась на всё время транзакции.
+    """
+    changes = RecipeIngredientsChange.objects.bulk_create(
+        RecipeIngredientsChange(recipe_id=recipe_id)
+        for recipe_id in set(recipe_ids)
+    )
+    if changes and changes[-1].pk is not None:
+        RecipeIngredientsChange.objects.filter(
+            pk__lte=changes[-1].pk - PANTRY_CHANGE_LOG_SIZE
+        ).delete()
+    transaction.on_commit(lambda: data_versions.bump(RECIPE_INGREDIENTS))
+
+
+def recent_changes(after):
+    """
+    Записи журнала (id, id рецепта) с id больше after и последние
+    PANTRY_CHANGE_WINDOW записей до него, по возрастанию id
+    """
+    return list(
+        RecipeIngredientsChange.objects.filter(
+            pk__gt=after - PANTRY_CHANGE_WINDOW
+        ).order_by('pk').values_list('pk', 'recipe_id')[
+            :PANTRY_CHANGE_WINDOW + PANTRY_MAX_INCREMENTAL + 1
+        ]
+    )
+
+
+class PantryIndex:
+
+    def __init__(self):
+        self._snapshot = None
+        self._version = None
+        self._last_change = 0
+        self._seen = frozenset()
+        self._lock = threading.Lock()
+
+    def _remember(self, changes):
+        """Запоминает просмотренные записи журнала в пределах окна"""
+        if changes:
+            self._last_change = max(self._last_change, changes[-1][0])
+        self._seen = frozenset(
+            pk for pk, _ in changes
+            if pk > self._last_change - PANTRY_CHANGE_WINDOW
+        )
+
+    def build(self):
+        version = data_versions.get(RECIPE_INGREDIENTS)
+        changes = list(
+            RecipeIngredientsChange.objects.order_by('-pk').values_list(
+                'pk', 'recipe_id'
+            )[:PANTRY_CHANGE_WINDOW]
+        )[::-1]
+        recipes = defaultdict(lambda: array('q'))
+        ingredients = defaultdict(list)
+        rows = RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id').distinct()
+        for ingredient_id, recipe_id in rows.iterator(chunk_size=5000):
+            recipes[ingredient_id].append(recipe_id)
+            ingredients[recipe_id].append(ingredient_id)
+        self._snapshot = (
+            dict(recipes),
+            {recipe_id: tuple(ids) for recipe_id, ids in ingredients.items()}
+        )
+        self._version = version
+        self._last_change = 0
+        self._remember(changes)
+        return self._snapshot
+
+    def update(self):
+        """
+        Применяет к индексу изменения из журнала; строит индекс
+        заново, если изменений слишком много или журнал обрезан.
+        """
+        version = data_versions.get(RECIPE_INGREDIENTS)
+        changes = recent_changes(self._last_change)
+        unseen = [
+            (pk, recipe_id) for pk, recipe_id in changes
+            if pk not in self._seen
+        ]
+        # Изменений слишком много или нужные записи уже удалены из журнала
+        if (len(unseen) > PANTRY_MAX_INCREMENTAL
+                or (changes and changes[-1][0] - self._last_change
+                    > PANTRY_CHANGE_LOG_SIZE - PANTRY_CHANGE_WINDOW)):
+            return self.build()
+        if not unseen:
+            self._version = version
+            self._remember(changes)
+            return self._snapshot
+        changed = {recipe_id for _, recipe_id in unseen}
+        current = defaultdict(set)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=changed
+        ).values_list('recipe_id', 'ingredient_id'):
+            current[recipe_id].add(ingredient_id)
+        recipes, ingredients = self._snapshot
+        removed, added = defaultdict(set), defaultdict(list)
+        for recipe_id in changed:
+            old = set(ingredients.get(recipe_id, ()))
+            new = current.get(recipe_id, set())
+            for ingredient_id in old - new:
+                removed[ingredient_id].add(recipe_id)
+            for ingredient_id in new - old:
+                added[ingredient_id].append(recipe_id)
+            if new:
+                ingredients[recipe_id] = tuple(new)
+            else:
+                ingredients.pop(recipe_id, None)
+        # Массивы заменяются целиком: match() может читать их параллельно
+        for ingredient_id in removed.keys() | added.keys():
+            ids = array('q', (
+                recipe_id for recipe_id in recipes.get(ingredient_id, ())
+                if recipe_id not in removed[ingredient_id]
+            ))
+            ids.extend(added[ingredient_id])
+            if ids:
+                recipes[ingredient_id] = ids
+            else:
+                recipes.pop(ingredient_id, None)
+        self._version = version
+        self._remember(changes)
+        return self._snapshot
+
+    def warm_up(self):
+        """Строит индекс при старте воркера, если база уже доступна"""
+        try:
+            self.build()
+        except DatabaseError:
+            self._snapshot = None
+
+    def get_snapshot(self):
+        snapshot = self._snapshot
+        if (snapshot is None
+                or self._version != data_versions.get(RECIPE_INGREDIENTS)):
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = self.build()
+                elif (self._version
+                        != data_versions.get(RECIPE_INGREDIENTS)):
+                    snapshot = self.update()
+        return snapshot
+
+    def match(self, ingredient_ids, max_missing=0):
+        """
+        Возвращает список (recipe_id, покрытие, не хватает) рецептов,
+        для которых не хватает не больше max_missing ингредиентов,
+        по убыванию покрытия.
+        """
+        recipes, ingredients = self.get_snapshot()
+        found = Counter()
+        for ingredient_id in set(ingredient_ids):
+            found.update(recipes.get(ingredient_id, ()))
+        result = []
+        for recipe_id, count in found.items():
+            total = len(ingredients.get(recipe_id, ()))
+            if not total:
+                continue
+            missing = total - count
+            if missing <= max_missing:
+                result.append((recipe_id, count / total, missing))
+        result.sort(key=lambda item: (-item[1], item[2], item[0]))
+        return result
+
+
+pantry_index = PantryIndex()
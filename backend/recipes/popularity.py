@@ -0,0 +1,121 @@
+"""
+Популярность рецептов с затуханием во времени.
+
+Добавление в избранное или корзину увеличивает Recipe.popularity
+на вес действия; команда decay_popularity периодически умножает все
+оценки на коэффициент затухания (период полураспада
+POPULARITY_HALF_LIFE_HOURS). Удаление вычитает вклад действия
+с учётом затухания за время, прошедшее с добавления (added_at).
+Первые страницы ?ordering=popular отдаются по id из таблицы лидеров,
+которая хранится в памяти воркера и обновляется раз в
+POPULAR_LEADERBOARD_TTL секунд.
+"""
+from time import monotonic
+
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from utils.constants import (POPULAR_LEADERBOARD_SIZE,
+                             POPULAR_LEADERBOARD_TTL,
+                             POPULARITY_HALF_LIFE_HOURS, POPULARITY_MIN_SCORE)
+
+from .models import Recipe
+
+POPULAR = 'popular'
+POPULAR_ORDERING = ('-popularity', 'id')
+
+
+def added_popularity(weight):
+    """Выражение для UPDATE: популярность после действия веса weight"""
+    return Greatest(F('popularity') + weight, Value(0.0))
+
+
+def decayed_weight(weight, added_at, now):
+    """Вклад действия веса weight, сделанного в added_at, к моменту now"""
+    hours = max((now - added_at).total_seconds(), 0) / 3600
+    return weight * 0.5 ** (hours / POPULARITY_HALF_LIFE_HOURS)
+
+
+def withdrawn_popularity(added_at, weight):
+    """
+    Выражение для UPDATE: популярность рецептов без вкладов действий
+    веса weight ({recipe_id: время добавления}), не ниже нуля.
+    """
+    now = timezone.now()
+    return Greatest(
+        F('popularity') - Case(
+            *(When(pk=pk, then=Value(decayed_weight(weight, at, now)))
+              for pk, at in added_at.items()),
+            default=Value(0.0),
+            output_field=FloatField()
+        ),
+        Value(0.0)
+    )
+
+
+def decay_popularity(recipe_ids, factor):
+    """Умножает популярность рецептов на factor, малые оценки обнуляет"""
+    recipes = Recipe.objects.filter(pk__in=recipe_ids, popularity__gt=0)
+    faded = recipes.filter(
+        popularity__lt=POPULARITY_MIN_SCORE / factor
+    ).update(popularity=0)
+    return faded + recipes.update(popularity=F('popularity') * factor)
+
+
+class Leaderboard:
+    """Первые POPULAR_LEADERBOARD_SIZE id рецептов по популярности"""
+
+    def __init__(self, size=POPULAR_LEADERBOARD_SIZE,
+                 ttl=POPULAR_LEADERBOARD_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._cached = None
+
+    def get(self):
+        """Возвращает (список id, общее количество рецептов)"""
+        cached = self._cached
+        if cached is not None and monotonic() - cached[2] < self.ttl:
+            return cached[0], cached[1]
+        ids = list(
+            Recipe.objects.order_by(*POPULAR_ORDERING)
+            .values_list('pk', flat=True)[:self.size]
+        )
+        total = Recipe.objects.count()
+        self._cached = (ids, total, monotonic())
+        return ids, total
+
+    def expire(self):
+        self._cached = None
+
+    def recipes(self, queryset):
+        ids, total = self.get()
+        return LeaderboardRecipes(queryset, ids, total)
+
+
+class LeaderboardRecipes:
+    """
+    Последовательность рецептов по популярности для пагинатора:
+    срезы в пределах таблицы лидеров читаются по id, дальше -
+    обычным запросом с сортировкой по индексу.
+    """
+
+    def __init__(self, queryset, ids, total):
+        self.queryset = queryset
+        self.ids = ids
+        self.total = total
+
+    def count(self):
+        return self.total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, key):
+        if key.stop is not None and key.stop <= len(self.ids):
+            ids = self.ids[key]
+            recipes = self.queryset.in_bulk(ids)
+            return [recipes[pk] for pk in ids if pk in recipes]
+        return list(self.queryset.order_by(*POPULAR_ORDERING)[key])
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,206 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from users.models import CustomUser, Subscription
+from utils.constants import (CART_POPULARITY_WEIGHT,
+                             FAVORITE_POPULARITY_WEIGHT)
+from utils.counters import change_counter
+
+from . import feed, pantry_index, shopping_list, similarity, tag_masks
+from .models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from .popularity import added_popularity, withdrawn_popularity
+from .reference import INGREDIENTS, TAGS, data_versions
+from .signals import recipe_components_changed, user_recipes_changed
+from .user_recipes import user_recipe_ids
+
+COUNTER_FIELDS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'carts_count',
+}
+POPULARITY_WEIGHTS = {
+    Favorite: FAVORITE_POPULARITY_WEIGHT,
+    ShoppingCart: CART_POPULARITY_WEIGHT,
+}
+
+
+@receiver(user_recipes_changed, sender=ShoppingCart)
+def update_shopping_list(sender, user_id, action, recipe_ids, **kwargs):
+    """Обновляет список покупок при изменении корзины"""
+    shopping_list.apply_cart_change(
+        user_id, recipe_ids, 1 if action == 'add' else -1
+    )
+
+
+@receiver(recipe_components_changed, sender=Recipe)
+def update_shopping_lists_for_recipe(sender, recipe, created,
+                                     ingredient_delta, **kwargs):
+    """Обновляет списки покупок при изменении состава рецепта"""
+    if not created:
+        shopping_list.apply_recipe_change(recipe.pk, ingredient_delta)
+
+
+@receiver(recipe_components_changed, sender=Recipe)
+def update_similarity_index(sender, recipe, ingredient_delta, **kwargs):
+    """Пересчитывает LSH-корзины при изменении ингредиентов рецепта"""
+    if ingredient_delta:
+        similarity.index_recipes([recipe.pk])
+
+
+@receiver(recipe_components_changed, sender=Recipe)
+def log_recipe_ingredients_change(sender, recipe, ingredient_delta,
+                                  **kwargs):
+    """Отмечает рецепт для обновления индекса подбора по продуктам"""
+    if ingredient_delta:
+        pantry_index.recipes_changed([recipe.pk])
+
+
+@receiver(recipe_components_changed, sender=Recipe)
+def update_tags_mask(sender, recipe, tags_changed, **kwargs):
+    """Пересчитывает маску тегов рецепта"""
+    if tags_changed:
+        tag_masks.update_masks(Recipe.objects.filter(pk=recipe.pk))
+
+
+@receiver(pre_save, sender=Tag)
+def assign_tag_bit(sender, instance, **kwargs):
+    """Назначает новому тегу свободный бит маски"""
+    if instance.bit is None:
+        instance.bit = tag_masks.free_bit(exclude_pk=instance.pk)
+
+
+@receiver(post_delete, sender=Tag)
+def clear_tag_bit(sender, instance, **kwargs):
+    """Освобождает бит удалённого тега в масках рецептов"""
+    if instance.bit is not None:
+        tag_masks.clear_bit(instance.bit)
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def refresh_shopping_list(sender, instance, **kwargs):
+    """
+    Пересчитывает список покупок после изменения корзины через ORM
+    (админка, каскадное удаление рецепта) - после фиксации транзакции.
+    """
+    transaction.on_commit(
+        lambda: shopping_list.refresh_shopping_lists([instance.user_id])
+    )
+
+
+@receiver(user_recipes_changed)
+def expire_user_recipe_ids(sender, user_id, **kwargs):
+    """Помечает устаревшими id рецептов пользователя в избранном/корзине"""
+    user_recipe_ids.changed(user_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def expire_user_recipe_ids_on_save(sender, instance, **kwargs):
+    """То же при изменении через ORM (админка, каскадное удаление)"""
+    user_recipe_ids.changed(instance.user_id)
+
+
+@receiver(user_recipes_changed)
+def update_recipe_counters(sender, action, recipe_ids, added_at=None,
+                           **kwargs):
+    """
+    Обновляет счётчики избранного/корзин и популярность рецептов одним
+    UPDATE: добавление увеличивает популярность на вес действия,
+    удаление вычитает его вклад с учётом затухания.
+    """
+    weight = POPULARITY_WEIGHTS[sender]
+    if action == 'add':
+        delta, popularity = 1, added_popularity(weight)
+    else:
+        delta, popularity = -1, withdrawn_popularity(added_at or {}, weight)
+    change_counter(
+        Recipe.objects.filter(pk__in=recipe_ids),
+        COUNTER_FIELDS[sender], delta, popularity=popularity
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Recipe.objects.filter(pk=instance.recipe_id),
+            COUNTER_FIELDS[sender],
+            popularity=added_popularity(POPULARITY_WEIGHTS[sender])
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id),
+        COUNTER_FIELDS[sender], -1,
+        popularity=withdrawn_popularity(
+            {instance.recipe_id: instance.added_at},
+            POPULARITY_WEIGHTS[sender]
+        )
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            CustomUser.objects.filter(pk=instance.author_id), 'recipes_count'
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_vector(sender, instance, update_fields, **kwargs):
+    """Обновляет поисковый вектор при изменении названия или описания"""
+    if update_fields and not {'name', 'text'} & set(update_fields):
+        return
+    Recipe.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    change_counter(
+        CustomUser.objects.filter(pk=instance.author_id),
+        'recipes_count', -1
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def log_recipe_ingredients_on_delete(sender, instance, **kwargs):
+    pantry_index.recipes_changed([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    """Раскладывает новый рецепт по лентам подписчиков после фиксации"""
+    if created:
+        transaction.on_commit(lambda: feed.fan_out(
+            instance.pk, instance.author_id, instance.pub_date
+        ))
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            lambda: feed.backfill(instance.user_id, instance.following_id)
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def clear_timeline(sender, instance, **kwargs):
+    feed.unfollow(instance.user_id, instance.following_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_data_version(sender, **kwargs):
+    """Увеличивает версию справочника при изменении тегов/ингредиентов"""
+    data_versions.bump(TAGS if sender is Tag else INGREDIENTS)
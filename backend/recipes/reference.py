@@ -0,0 +1,172 @@
+"""
+Версионированные снимки справочных данных (теги, ингредиенты).
+
+Номер версии хранится в DataVersion и увеличивается при любом изменении;
+воркер перечитывает его не чаще раза в REFERENCE_VERSION_TTL секунд.
+Тела ответов сериализуются и сжимаются gzip один раз на версию
+и хранятся в памяти воркера; ETag строится из версии и параметров,
+поэтому 304 отдаётся без обращения к базе и сериализации.
+"""
+import gzip
+import hashlib
+import json
+from collections import OrderedDict
+from time import monotonic
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from utils.constants import REFERENCE_CACHE_SIZE, REFERENCE_VERSION_TTL
+
+from .models import DataVersion
+
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+RECIPE_INGREDIENTS = 'recipe_ingredients'
+
+
+class DataVersions:
+    """Кэш номеров версий в памяти воркера"""
+
+    def __init__(self, ttl=REFERENCE_VERSION_TTL):
+        self.ttl = ttl
+        self._versions = {}
+
+    def _cached(self, name):
+        cached = self._versions.get(name)
+        if cached is not None and monotonic() - cached[1] < self.ttl:
+            return cached[0]
+        return None
+
+    def get(self, name):
+        version = self._cached(name)
+        if version is None:
+            version = DataVersion.objects.filter(
+                name=name
+            ).values_list('version', flat=True).first() or 0
+            self._versions[name] = (version, monotonic())
+        return version
+
+    async def aget(self, name):
+        """То же, что get, через асинхронный ORM"""
+        version = self._cached(name)
+        if version is None:
+            version = await DataVersion.objects.filter(
+                name=name
+            ).values_list('version', flat=True).afirst() or 0
+            self._versions[name] = (version, monotonic())
+        return version
+
+    def expire(self, name):
+        self._versions.pop(name, None)
+
+    def bump(self, name):
+        """Увеличивает версию; воркер увидит её сразу после фиксации"""
+        if not DataVersion.objects.filter(name=name).update(
+            version=F('version') + 1
+        ):
+            DataVersion.objects.get_or_create(
+                name=name, defaults={'version': 1}
+            )
+        transaction.on_commit(lambda: self.expire(name))
+
+
+class SnapshotCache:
+    """Готовые тела ответов (обычное и gzip) по ключу, LRU"""
+
+    def __init__(self, size=REFERENCE_CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+
+    def peek(self, key, version):
+        """Готовые тела для версии version или None, без построения"""
+        item = self._items.get(key)
+        if item is None or item[0] != version:
+            return None
+        self._items.move_to_end(key)
+        return item[1], item[2]
+
+    def get(self, key, version, build_data):
+        item = self._items.get(key)
+        if item is None or item[0] != version:
+            body = json.dumps(
+                build_data(), ensure_ascii=False, separators=(',', ':')
+            ).encode('utf-8')
+            item = (version, body, gzip.compress(body))
+            self._items[key] = item
+            if len(self._items) > self.size:
+                self._items.popitem(last=False)
+        self._items.move_to_end(key)
+        return item[1], item[2]
+
+
+data_versions = DataVersions()
+snapshots = SnapshotCache()
+
+
+def _snapshot_etag(name, version, params, use_gzip):
+    etag = f'{name}-{version}'
+    if params:
+        etag += '-' + hashlib.md5(
+            repr(params).encode('utf-8')
+        ).hexdigest()[:12]
+    if use_gzip:
+        etag += '-gzip'
+    return f'"{etag}"'
+
+
+def _snapshot_response(bodies, use_gzip):
+    body, gzip_body = bodies
+    response = HttpResponse(
+        gzip_body if use_gzip else body, content_type='application/json'
+    )
+    if use_gzip:
+        response['Content-Encoding'] = 'gzip'
+    response['Content-Length'] = len(response.content)
+    return response
+
+
+def _finish_response(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def snapshot_response(request, name, build_data, params=()):
+    """
+    Отдаёт снимок набора данных name для параметров params.
+    build_data вызывается только если тела для текущей версии нет.
+    """
+    version = data_versions.get(name)
+    use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    etag = _snapshot_etag(name, version, params, use_gzip)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = _snapshot_response(
+            snapshots.get((name, params), version, build_data), use_gzip
+        )
+    return _finish_response(response, etag)
+
+
+async def asnapshot_response(request, name, build_data, params=()):
+    """
+    Асинхронный вариант snapshot_response: версия читается
+    асинхронным ORM, готовое тело отдаётся без перехода в поток;
+    build_data (синхронный) вызывается в потоке только при промахе.
+    """
+    version = await data_versions.aget(name)
+    use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    etag = _snapshot_etag(name, version, params, use_gzip)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        key = (name, params)
+        bodies = snapshots.peek(key, version)
+        if bodies is None:
+            bodies = await sync_to_async(snapshots.get)(
+                key, version, build_data
+            )
+        response = _snapshot_response(bodies, use_gzip)
+    return _finish_response(response, etag)
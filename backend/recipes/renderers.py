@@ -0,0 +1,31 @@
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    """
+    Базовый рендерер форматов списка покупок.
+    Нужен для выбора формата по ?format= или Accept;
+    сам файл формирует utils.services.create_cart_file,
+    здесь отрисовываются только сообщения об ошибках.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'detail' in data:
+            data = data['detail']
+        return str(data).encode(self.charset)
+
+
+class TxtRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CsvRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class MarkdownRenderer(ShoppingCartRenderer):
+    media_type = 'text/markdown'
+    format = 'md'
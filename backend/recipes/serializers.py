@@ -1,8 +1,18 @@
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             RecipeTag, ShoppingCart, Tag)
+from recipes.signals import recipe_components_changed
+from recipes.user_recipes import contains, user_recipe_ids
 from rest_framework import serializers
+from users.loaders import SubscriptionLoader
 from users.serializers import UserSerializer
+from utils.constants import (INGREDIENT_SEARCH_LIMIT,
+                             INGREDIENT_SEARCH_MAX_LIMIT, MAX_BULK_RECIPES,
+                             MAX_PANTRY_INGREDIENTS, PANTRY_MAX_MISSING,
+                             SIMILAR_MAX_CANDIDATES, SIMILAR_RECIPES_LIMIT)
+from utils.loaders import LoaderListSerializer
+from utils.serializers import UpdateFieldsMixin
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -21,6 +31,18 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class IngredientSearchSerializer(serializers.Serializer):
+    """Параметры поиска ингредиентов для автодополнения"""
+    name = serializers.CharField(required=False, default='', allow_blank=True)
+    limit = serializers.IntegerField(
+        required=False,
+        default=INGREDIENT_SEARCH_LIMIT,
+        min_value=1,
+        max_value=INGREDIENT_SEARCH_MAX_LIMIT
+    )
+    words = serializers.BooleanField(required=False, default=False)
+
+
 class RecipeTagSerializer(serializers.PrimaryKeyRelatedField):
     """
     Сериализатор для добавления тэгов в рецепт по pk
@@ -31,8 +53,12 @@ class RecipeTagSerializer(serializers.PrimaryKeyRelatedField):
 
 
 class InputIngredientSerializer(serializers.ModelSerializer):
-    """Сериализатор для добавления игридиента в рецепт"""
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    """
+    Сериализатор для добавления игридиента в рецепт.
+    Существование ингредиентов проверяется одним запросом
+    в CreateRecipeSerializer.validate_ingredients.
+    """
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
@@ -51,15 +77,13 @@ class OutputIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class CreateRecipeSerializer(serializers.ModelSerializer):
+class CreateRecipeSerializer(UpdateFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для создания рецетов.
     """
     author = UserSerializer(read_only=True)
     ingredients = InputIngredientSerializer(many=True)
-    tags = RecipeTagSerializer(
-        queryset=Tag.objects.all(), many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField()
 
     class Meta:
@@ -68,46 +92,131 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
                   'name', 'image', 'text', 'cooking_time')
 
     def add_tags_and_ingredients(self, tags, ingredients, recipe):
-        for ingredient in ingredients:
-            RecipeIngredient.objects.create(
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
                 recipe=recipe,
-                ingredient=ingredient.pop('id'),
-                amount=ingredient.pop('amount')
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount']
+            ) for ingredient in ingredients
+        )
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag) for tag in tags
+        )
+        self.changed_rows = len(ingredients) + len(tags)
+        recipe_components_changed.send(
+            sender=Recipe, recipe=recipe, created=True,
+            changed_rows=self.changed_rows, tags_changed=bool(tags),
+            ingredient_delta={
+                ingredient['id']: ingredient['amount']
+                for ingredient in ingredients
+            }
+        )
+
+    def sync_tags_and_ingredients(self, tags, ingredients, recipe):
+        """
+        Приводит связи рецепта к переданным тегам и ингредиентам
+        минимальным набором bulk-вставок, обновлений и удалений.
+        Возвращает количество изменённых строк.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        new = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        ingredient_delta = {}
+        to_create, to_update = [], []
+        for ingredient_id, amount in new.items():
+            row = current.get(ingredient_id)
+            if row is None:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                ))
+                ingredient_delta[ingredient_id] = amount
+            elif row.amount != amount:
+                ingredient_delta[ingredient_id] = amount - row.amount
+                row.amount = amount
+                to_update.append(row)
+        to_delete = [
+            row.pk for ingredient_id, row in current.items()
+            if ingredient_id not in new
+        ]
+        for ingredient_id in current.keys() - new.keys():
+            ingredient_delta[ingredient_id] = -current[ingredient_id].amount
+
+        current_tags = set(
+            RecipeTag.objects.filter(recipe=recipe)
+            .values_list('tag_id', flat=True)
+        )
+        new_tags = {tag.id for tag in tags}
+        tags_to_create = new_tags - current_tags
+        tags_to_delete = current_tags - new_tags
+
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if tags_to_create:
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag_id=tag_id)
+                for tag_id in tags_to_create
             )
-        for tag in tags:
-            RecipeTag.objects.create(
-                recipe=recipe,
-                tag=tag
+        if tags_to_delete:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=tags_to_delete
+            ).delete()
+
+        self.changed_rows = (
+            len(to_create) + len(to_update) + len(to_delete)
+            + len(tags_to_create) + len(tags_to_delete)
+        )
+        if self.changed_rows:
+            recipe_components_changed.send(
+                sender=Recipe, recipe=recipe, created=False,
+                changed_rows=self.changed_rows,
+                tags_changed=bool(tags_to_create or tags_to_delete),
+                ingredient_delta=ingredient_delta
             )
+        return self.changed_rows
 
     def validate_tags(self, value):
-        tags = value
-        if not tags:
+        if not value:
             raise serializers.ValidationError(
                 'Добавьте теги'
             )
-        tag_list = []
-        for tag in tags:
-            if tag in tag_list:
-                raise serializers.ValidationError(
-                    'Теги не могут повторяться'
-                )
-            tag_list.append(tag)
-        return value
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError(
+                'Теги не могут повторяться'
+            )
+        tags = list(Tag.objects.filter(id__in=value))
+        if len(tags) != len(value):
+            raise serializers.ValidationError(
+                'Указаны несуществующие теги'
+            )
+        return tags
 
     def validate_ingredients(self, value):
-        ingredients = value
-        if not ingredients:
+        if not value:
             raise serializers.ValidationError(
                 'Добавьте ингридиенты'
             )
-        ingredients_list = []
-        for ingredient in ingredients:
-            if ingredient in ingredients_list:
-                raise serializers.ValidationError(
-                    'Ингредиенты не могут повторяться'
-                )
-            ingredients_list.append(ingredient)
+        ids = {ingredient['id'] for ingredient in value}
+        if len(ids) != len(value):
+            raise serializers.ValidationError(
+                'Ингредиенты не могут повторяться'
+            )
+        existing = set(
+            Ingredient.objects.filter(id__in=ids).values_list('id', flat=True)
+        )
+        if existing != ids:
+            raise serializers.ValidationError(
+                'Указаны несуществующие ингредиенты: '
+                f'{sorted(ids - existing)}'
+            )
         return value
 
     def validate_image(self, value):
@@ -117,6 +226,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             )
         return value
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -126,17 +236,19 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        instance.ingredients.clear()
-        instance.tags.clear()
-        self.add_tags_and_ingredients(
+        self.sync_tags_and_ingredients(
             tags, ingredients, instance
         )
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        instance = Recipe.objects.with_user_flags(
+            self.context.get('request').user
+        ).for_output().get(pk=instance.pk)
         return OutputRecipeSerializer(instance, context=self.context).data
 
 
@@ -150,14 +262,75 @@ class OutputRecipeSerializer(serializers.ModelSerializer):
     )
     tags = RecipeTagSerializer(queryset=Tag.objects.all(), many=True)
     image = Base64ImageField()
-    is_favorited = serializers.ReadOnlyField(default=False)
-    is_in_shopping_cart = serializers.ReadOnlyField(default=False)
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
                   'name', 'image', 'text', 'cooking_time')
+        list_serializer_class = LoaderListSerializer
+
+    def prime_loaders(self, instances):
+        """
+        Передаёт загрузчику подписок флаги, уже посчитанные в SQL
+        (аннотация is_author_subscribed), остальных авторов - на загрузку.
+        """
+        loader = SubscriptionLoader.for_request(self.context.get('request'))
+        for recipe in instances:
+            is_subscribed = getattr(recipe, 'is_author_subscribed', None)
+            if is_subscribed is None:
+                loader.prime([recipe.author_id])
+            else:
+                loader.set(recipe.author_id, is_subscribed)
+
+    def current_user_recipes(self):
+        """(избранное, корзина) текущего пользователя"""
+        return user_recipe_ids.for_request(self.context.get('request'))
+
+    def get_is_favorited(self, obj):
+        return contains(self.current_user_recipes()[0], obj.pk)
+
+    def get_is_in_shopping_cart(self, obj):
+        return contains(self.current_user_recipes()[1], obj.pk)
+
+    def to_representation(self, instance):
+        self.prime_loaders([instance])
+        return super().to_representation(instance)
+
+
+class PantryRecipeSerializer(OutputRecipeSerializer):
+    """
+    Рецепт, подобранный по продуктам: доля имеющихся ингредиентов
+    и число недостающих.
+    """
+    coverage = serializers.SerializerMethodField()
+    missing = serializers.SerializerMethodField()
+
+    class Meta(OutputRecipeSerializer.Meta):
+        fields = OutputRecipeSerializer.Meta.fields + ('coverage', 'missing')
+
+    def get_coverage(self, obj):
+        return round(self.context['matches'][obj.pk][0], 3)
+
+    def get_missing(self, obj):
+        return self.context['matches'][obj.pk][1]
+
+
+class PantrySearchSerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся продуктам"""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_PANTRY_INGREDIENTS
+    )
+    missing = serializers.IntegerField(
+        required=False,
+        default=0,
+        min_value=0,
+        max_value=PANTRY_MAX_MISSING
+    )
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -173,16 +346,6 @@ class FavoriteSerializer(serializers.ModelSerializer):
             instance.recipe, context=self.context
         ).data
 
-    def validate(self, data):
-        if Favorite.objects.filter(
-            user=self.context.get('request').user,
-            recipe=self.context.get('recipe'),
-        ).exists():
-            raise serializers.ValidationError(
-                'Вы уже добавили рецепт в избранное'
-            )
-        return data
-
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
     """Сериализатор для корзины покупок"""
@@ -197,16 +360,6 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
             instance.recipe, context=self.context
         ).data
 
-    def validate(self, data):
-        if ShoppingCart.objects.filter(
-            user=self.context.get('request').user,
-            recipe=self.context.get('recipe'),
-        ).exists():
-            raise serializers.ValidationError(
-                'Вы уже добавили рецепт в корзину'
-            )
-        return data
-
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Сериализатор для рецептов с ограниченным набором полей"""
@@ -215,3 +368,33 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
+
+
+class SimilarRecipeSerializer(RecipeShortSerializer):
+    """Сериализатор похожего рецепта с мерой сходства по ингредиентам"""
+    similarity = serializers.SerializerMethodField()
+
+    class Meta(RecipeShortSerializer.Meta):
+        fields = RecipeShortSerializer.Meta.fields + ('similarity',)
+
+    def get_similarity(self, obj):
+        return round(self.context['scores'][obj.pk], 3)
+
+
+class SimilarSearchSerializer(serializers.Serializer):
+    """Параметры выдачи похожих рецептов"""
+    limit = serializers.IntegerField(
+        required=False,
+        default=SIMILAR_RECIPES_LIMIT,
+        min_value=1,
+        max_value=SIMILAR_MAX_CANDIDATES
+    )
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для массовых операций"""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES
+    )
@@ -0,0 +1,154 @@
+"""
+Поддержка материализованного списка покупок (ShoppingCartIngredient).
+
+Изменения корзины и состава рецептов применяются как приращения
+одним запросом INSERT ... ON CONFLICT DO UPDATE; для путей через ORM
+(админка, каскадное удаление) список пользователя пересчитывается целиком.
+"""
+from django.db import connection, models, transaction
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingCartIngredient
+
+
+def _tables():
+    quote = connection.ops.quote_name
+    return (
+        quote(ShoppingCartIngredient._meta.db_table),
+        quote(RecipeIngredient._meta.db_table),
+        quote(ShoppingCart._meta.db_table),
+    )
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _upsert(select_sql, params):
+    """
+    Прибавляет количества к строкам списка покупок и удаляет
+    из затронутых строк те, что обнулились.
+    """
+    shopping_list, _, _ = _tables()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {shopping_list} (user_id, ingredient_id, amount) '
+            f'{select_sql} '
+            f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+            f'SET amount = {shopping_list}.amount + EXCLUDED.amount '
+            f'RETURNING id, amount',
+            params
+        )
+        emptied = [pk for pk, amount in cursor.fetchall() if amount <= 0]
+        if emptied:
+            cursor.execute(
+                f'DELETE FROM {shopping_list} '
+                f'WHERE id IN ({_placeholders(emptied)}) AND amount <= 0',
+                emptied
+            )
+
+
+def apply_cart_change(user_id, recipe_ids, sign):
+    """
+    Добавляет (sign=1) или вычитает (sign=-1) ингредиенты
+    рецептов recipe_ids в списке покупок пользователя.
+    """
+    if not recipe_ids:
+        return
+    recipe_ids = list(recipe_ids)
+    _, recipe_ingredient, _ = _tables()
+    _upsert(
+        f'SELECT %s, ingredient_id, %s * SUM(amount) '
+        f'FROM {recipe_ingredient} '
+        f'WHERE recipe_id IN ({_placeholders(recipe_ids)}) '
+        f'GROUP BY ingredient_id',
+        [user_id, sign, *recipe_ids]
+    )
+
+
+def apply_recipe_change(recipe_id, ingredient_delta):
+    """
+    Применяет изменение состава рецепта
+    ко всем пользователям, у которых он в корзине.
+    """
+    if not ingredient_delta:
+        return
+    _, _, shopping_cart = _tables()
+    delta_sql = ' UNION ALL '.join(
+        ['SELECT %s AS ingredient_id, %s AS delta'] * len(ingredient_delta)
+    )
+    params = [value for item in ingredient_delta.items() for value in item]
+    _upsert(
+        f'SELECT cart.user_id, delta.ingredient_id, delta.delta '
+        f'FROM {shopping_cart} cart CROSS JOIN ({delta_sql}) delta '
+        f'WHERE cart.recipe_id = %s',
+        [*params, recipe_id]
+    )
+
+
+def refresh_shopping_lists(user_ids):
+    """Пересчитывает списки покупок пользователей по корзине"""
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return
+    shopping_list, recipe_ingredient, shopping_cart = _tables()
+    placeholders = _placeholders(user_ids)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {shopping_list} WHERE user_id IN ({placeholders})',
+            user_ids
+        )
+        cursor.execute(
+            f'INSERT INTO {shopping_list} (user_id, ingredient_id, amount) '
+            f'SELECT cart.user_id, ri.ingredient_id, SUM(ri.amount) '
+            f'FROM {shopping_cart} cart '
+            f'JOIN {recipe_ingredient} ri ON ri.recipe_id = cart.recipe_id '
+            f'WHERE cart.user_id IN ({placeholders}) '
+            f'GROUP BY cart.user_id, ri.ingredient_id',
+            user_ids
+        )
+
+
+def refresh_for_recipes(recipe_ids):
+    """
+    После фиксации транзакции пересчитывает списки покупок
+    пользователей, у которых рецепты recipe_ids в корзине.
+    """
+    def refresh():
+        refresh_shopping_lists(
+            ShoppingCart.objects.filter(recipe_id__in=recipe_ids)
+            .values_list('user_id', flat=True)
+        )
+    transaction.on_commit(refresh)
+
+
+def live_shopping_list(user_ids):
+    """
+    Возвращает список покупок, посчитанный по корзине:
+    {user_id: {ingredient_id: amount}}.
+    """
+    result = {user_id: {} for user_id in user_ids}
+    rows = ShoppingCart.objects.filter(
+        user_id__in=user_ids,
+        recipe__ingredients_in_recipe__isnull=False
+    ).values_list(
+        'user_id', 'recipe__ingredients_in_recipe__ingredient_id'
+    ).annotate(
+        total=models.Sum('recipe__ingredients_in_recipe__amount')
+    ).order_by()
+    for user_id, ingredient_id, total in rows:
+        result[user_id][ingredient_id] = total
+    return result
+
+
+def stored_shopping_list(user_ids):
+    """
+    Возвращает материализованный список покупок:
+    {user_id: {ingredient_id: amount}}.
+    """
+    result = {user_id: {} for user_id in user_ids}
+    rows = ShoppingCartIngredient.objects.filter(
+        user_id__in=user_ids
+    ).values_list('user_id', 'ingredient_id', 'amount')
+    for user_id, ingredient_id, amount in rows:
+        result[user_id][ingredient_id] = amount
+    return result
@@ -0,0 +1,14 @@
+from django.dispatch import Signal
+
+# Отправляется после изменения связей рецепта с ингредиентами и тегами
+# (bulk-операции не вызывают post_save/post_delete).
+# Аргументы: recipe, created, changed_rows, tags_changed,
+# ingredient_delta - {ingredient_id: изменение количества}.
+recipe_components_changed = Signal()
+
+# Отправляется после добавления/удаления рецептов в избранное или корзину
+# (sender - Favorite или ShoppingCart).
+# Аргументы: user_id, action - 'add' или 'remove',
+# recipe_ids - множество id рецептов, которые действительно изменились;
+# при 'remove' ещё added_at - {recipe_id: время добавления}.
+user_recipes_changed = Signal()
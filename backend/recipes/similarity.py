@@ -0,0 +1,104 @@
+"""
+Поиск похожих рецептов по составу ингредиентов (MinHash + LSH).
+
+Для набора ингредиентов рецепта считается MinHash-сигнатура из
+MINHASH_BANDS * MINHASH_ROWS хэш-функций, сигнатура режется на полосы,
+хэш каждой полосы (вместе с её номером) хранится в RecipeBucket.
+Рецепты с общими корзинами - кандидаты; среди них точное сходство
+Жаккара считается по ингредиентам, поэтому поиск не зависит
+от размера каталога.
+"""
+import hashlib
+import random
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+from utils.constants import (MINHASH_BANDS, MINHASH_ROWS, MINHASH_SEED,
+                             SIMILAR_MAX_CANDIDATES)
+
+from .models import RecipeBucket, RecipeIngredient
+
+PRIME = (1 << 61) - 1
+
+_random = random.Random(MINHASH_SEED)
+HASH_FUNCTIONS = [
+    (_random.randrange(1, PRIME), _random.randrange(0, PRIME))
+    for _ in range(MINHASH_BANDS * MINHASH_ROWS)
+]
+
+
+def minhash_signature(ingredient_ids):
+    return [
+        min((a * pk + b) % PRIME for pk in ingredient_ids)
+        for a, b in HASH_FUNCTIONS
+    ]
+
+
+def recipe_buckets(ingredient_ids):
+    """Возвращает LSH-корзины (знаковые 64-битные) набора ингредиентов"""
+    if not ingredient_ids:
+        return []
+    signature = minhash_signature(ingredient_ids)
+    buckets = []
+    for band in range(MINHASH_BANDS):
+        rows = signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]
+        digest = hashlib.blake2b(
+            repr((band, rows)).encode(), digest_size=8
+        ).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def ingredient_sets(recipe_ids):
+    result = defaultdict(set)
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient_id')
+    for recipe_id, ingredient_id in rows:
+        result[recipe_id].add(ingredient_id)
+    return result
+
+
+@transaction.atomic
+def index_recipes(recipe_ids):
+    """Пересчитывает LSH-корзины рецептов"""
+    recipe_ids = list(recipe_ids)
+    ingredients = ingredient_sets(recipe_ids)
+    RecipeBucket.objects.filter(recipe_id__in=recipe_ids).delete()
+    RecipeBucket.objects.bulk_create(
+        RecipeBucket(recipe_id=recipe_id, bucket=bucket)
+        for recipe_id in recipe_ids
+        for bucket in recipe_buckets(ingredients[recipe_id])
+    )
+
+
+def similar_recipes(recipe_id, limit):
+    """
+    Возвращает список (recipe_id, сходство) до limit рецептов,
+    наиболее похожих по составу на рецепт recipe_id.
+    """
+    candidates = list(
+        RecipeBucket.objects.filter(
+            bucket__in=RecipeBucket.objects.filter(
+                recipe_id=recipe_id
+            ).values('bucket')
+        ).exclude(
+            recipe_id=recipe_id
+        ).values('recipe_id').annotate(
+            shared=Count('id')
+        ).order_by('-shared', 'recipe_id').values_list(
+            'recipe_id', flat=True
+        )[:SIMILAR_MAX_CANDIDATES]
+    )
+    if not candidates:
+        return []
+    ingredients = ingredient_sets([recipe_id, *candidates])
+    target = ingredients[recipe_id]
+    scores = [
+        (candidate, len(target & ingredients[candidate])
+         / len(target | ingredients[candidate]))
+        for candidate in candidates
+    ]
+    scores.sort(key=lambda item: (-item[1], item[0]))
+    return [item for item in scores[:limit] if item[1] > 0]
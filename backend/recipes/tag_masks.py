@@ -0,0 +1,97 @@
+"""
+Маска тегов рецепта.
+
+Каждому тегу назначается свой бит (Tag.bit, не больше TAG_MASK_BITS
+тегов), а рецепт хранит OR битов своих тегов в Recipe.tags_mask.
+Фильтр ?tags=a&tags=b превращается в одно условие
+tags_mask & маска > 0 - без JOIN через RecipeTag и DISTINCT.
+Соответствие slug -> бит хранится в памяти воркера по версии TAGS.
+Маски пересчитываются при изменении тегов рецепта и удалении тега;
+команда rebuild_tag_masks пересчитывает все маски целиком.
+"""
+from django.db.models import BigIntegerField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import GreaterThan
+from utils.constants import TAG_MASK_BITS
+
+from .models import Recipe, RecipeTag, Tag
+from .reference import TAGS, data_versions
+
+
+def free_bit(exclude_pk=None):
+    """Наименьший свободный бит или None, если все заняты"""
+    used = set(
+        Tag.objects.exclude(pk=exclude_pk).exclude(bit=None)
+        .values_list('bit', flat=True)
+    )
+    return min(set(range(TAG_MASK_BITS)) - used, default=None)
+
+
+def assign_bits():
+    """Назначает биты тегам без бита; возвращает их количество"""
+    assigned = 0
+    for tag in Tag.objects.filter(bit=None).order_by('pk'):
+        tag.bit = free_bit()
+        if tag.bit is None:
+            break
+        Tag.objects.filter(pk=tag.pk).update(bit=tag.bit)
+        assigned += 1
+    return assigned
+
+
+def update_masks(recipes):
+    """Пересчитывает маски рецептов (queryset) одним UPDATE"""
+    return recipes.update(tags_mask=Coalesce(
+        Subquery(
+            RecipeTag.objects.filter(recipe=OuterRef('pk')).values(
+                'recipe'
+            ).annotate(
+                mask=Sum(Cast(Value(1), BigIntegerField()).bitleftshift(
+                    F('tag__bit')
+                ))
+            ).values('mask')
+        ),
+        0,
+        output_field=BigIntegerField()
+    ))
+
+
+def clear_bit(bit):
+    """Снимает бит удалённого тега со всех рецептов"""
+    return Recipe.objects.filter(
+        GreaterThan(F('tags_mask').bitand(1 << bit), 0)
+    ).update(tags_mask=F('tags_mask') - (1 << bit))
+
+
+class TagBits:
+    """Биты тегов по slug в памяти воркера"""
+
+    def __init__(self):
+        self._version = None
+        self._bits = {}
+
+    def get(self):
+        version = data_versions.get(TAGS)
+        if version != self._version:
+            self._bits = dict(Tag.objects.values_list('slug', 'bit'))
+            self._version = version
+        return self._bits
+
+    def choices(self):
+        return [(slug, slug) for slug in self.get()]
+
+    def filter(self, queryset, slugs):
+        """
+        Рецепты хотя бы с одним из тегов. Если у какого-то тега
+        ещё нет бита, фильтрует через RecipeTag.
+        """
+        bits = self.get()
+        if any(bits.get(slug) is None for slug in slugs):
+            return queryset.filter(tags__slug__in=slugs).distinct()
+        mask = 0
+        for slug in slugs:
+            mask |= 1 << bits[slug]
+        return queryset.filter(GreaterThan(F('tags_mask').bitand(mask), 0))
+
+
+tag_bits = TagBits()
@@ -0,0 +1,102 @@
+"""
+Id рецептов в избранном и корзине пользователя.
+
+Хранятся в памяти воркера отсортированными массивами array('q')
+(LRU на USER_RECIPES_CACHE_SIZE пользователей) и заменяют подзапросы
+EXISTS: флаги is_favorited/is_in_shopping_cart списка берутся
+проверкой вхождения, а фильтры ?is_favorited=1/?is_in_shopping_cart=1
+начинают с id рецептов пользователя.
+Запись действительна, пока совпадает CustomUser.user_recipes_version:
+версия увеличивается в той же транзакции, что и изменение избранного
+или корзины, а пользователь загружается из базы при аутентификации,
+поэтому проверка не стоит запроса. Анонимный пользователь получает
+пустые массивы без обращения к базе.
+Пользователь читается из основной базы, поэтому и id рецептов
+читаются оттуда: иначе отстающая реплика сохранила бы в кэше
+старые id под новой версией.
+"""
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.models import F
+from users.models import CustomUser
+from utils.constants import USER_RECIPES_CACHE_SIZE
+
+from .models import Favorite, ShoppingCart
+
+EMPTY = (array('q'), array('q'))
+
+
+def contains(ids, recipe_id):
+    """Есть ли recipe_id в отсортированном массиве ids"""
+    index = bisect_left(ids, recipe_id)
+    return index < len(ids) and ids[index] == recipe_id
+
+
+class UserRecipeIds:
+    """Пары (избранное, корзина) пользователей, LRU"""
+
+    def __init__(self, size=USER_RECIPES_CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(model, user_id):
+        return array('q', model.objects.using(DEFAULT_DB_ALIAS).filter(
+            user_id=user_id
+        ).order_by('recipe_id').values_list('recipe_id', flat=True))
+
+    def get(self, user):
+        """(избранное, корзина) пользователя - отсортированные массивы id"""
+        if user.is_anonymous:
+            return EMPTY
+        with self._lock:
+            cached = self._items.get(user.pk)
+            if cached is not None and cached[0] == user.user_recipes_version:
+                self._items.move_to_end(user.pk)
+                return cached[1]
+        ids = (
+            self._load(Favorite, user.pk), self._load(ShoppingCart, user.pk)
+        )
+        # Внутри транзакции могут быть видны ещё не зафиксированные строки
+        if not connection.in_atomic_block:
+            with self._lock:
+                self._items[user.pk] = (user.user_recipes_version, ids)
+                self._items.move_to_end(user.pk)
+                if len(self._items) > self.size:
+                    self._items.popitem(last=False)
+        return ids
+
+    def for_request(self, request):
+        """get для пользователя запроса, один раз за HTTP-запрос"""
+        http_request = getattr(request, '_request', request)
+        ids = getattr(http_request, '_user_recipe_ids', None)
+        if ids is None:
+            ids = self.get(request.user)
+            http_request._user_recipe_ids = ids
+        return ids
+
+    async def afor_request(self, request):
+        """То же для асинхронных представлений"""
+        if request.user.is_anonymous:
+            return EMPTY
+        return await sync_to_async(self.for_request)(request)
+
+    def expire(self, user_id):
+        with self._lock:
+            self._items.pop(user_id, None)
+
+    def changed(self, user_id):
+        """Избранное или корзина пользователя изменились"""
+        CustomUser.objects.filter(pk=user_id).update(
+            user_recipes_version=F('user_recipes_version') + 1
+        )
+        self.expire(user_id)
+
+
+user_recipe_ids = UserRecipeIds()
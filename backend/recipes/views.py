@@ -1,24 +1,37 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Exists, OuterRef, Sum
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from short_url.models import ShortUrl
-from short_url.serializers import ShortUrlSerializer
-from utils.services import create_cart_txt, post_delete_instance, shorten_url
+from short_url.codes import encode
+from utils.constants import CART_ITERATOR_CHUNK_SIZE
+from utils.pagination import PageNumberAndLimit
+from utils.services import (add_user_recipes, bulk_post_delete_instances,
+                            create_cart_file, post_delete_instance)
 
-from .filters import IngridientFilter, RecipeFilter
+from .filters import RecipeFilter
+from .ingredient_index import ingredient_index
 from .mixins import FullUpdateMixin
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
-from .pagination import RecipePageNumberLimit
+from .models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from .pagination import FeedCursorPagination, RecipePageNumberLimit
+from .pantry_index import pantry_index
+from .popularity import POPULAR, leaderboard
 from .permissions import IsAuthorOrAuthenticatedOrRead
+from .reference import INGREDIENTS, TAGS, snapshot_response
+from .renderers import CsvRenderer, MarkdownRenderer, TxtRenderer
 from .serializers import (CreateRecipeSerializer, FavoriteSerializer,
-                          IngredientSerializer, OutputRecipeSerializer,
-                          ShoppingCartSerializer, TagSerializer)
+                          IngredientSearchSerializer, IngredientSerializer,
+                          OutputRecipeSerializer, PantryRecipeSerializer,
+                          PantrySearchSerializer, ShoppingCartSerializer,
+                          SimilarRecipeSerializer, SimilarSearchSerializer,
+                          TagSerializer)
+from .similarity import similar_recipes
 
 User = get_user_model()
 
@@ -29,14 +42,35 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     serializer_class = TagSerializer
 
+    def list(self, request, *args, **kwargs):
+        """Снимок списка тегов с ETag"""
+        return snapshot_response(
+            request, TAGS,
+            lambda: TagSerializer(Tag.objects.order_by('id'), many=True).data
+        )
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """Ингридиенты: CRUD только для администратора, GET для всех"""
     queryset = Ingredient.objects.all()
     pagination_class = None
     serializer_class = IngredientSerializer
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngridientFilter
+
+    def list(self, request, *args, **kwargs):
+        """
+        Автодополнение по индексу в памяти, без запросов к базе:
+        ?name= - начало названия без учёта регистра,
+        ?limit= - количество результатов,
+        ?words=1 - добавить совпадения по началу слов.
+        """
+        params = IngredientSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        return snapshot_response(
+            request, INGREDIENTS,
+            lambda: ingredient_index.search(**params),
+            (params['name'].lower(), params['limit'], params['words'])
+        )
 
 
 class RecipeViewSet(FullUpdateMixin,
@@ -53,37 +87,39 @@ class RecipeViewSet(FullUpdateMixin,
     permission_classes = [IsAuthorOrAuthenticatedOrRead]
     http_method_names = ['patch', 'get', 'post', 'delete']
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
-        data = {'user': self.request.user, 'recipe': serializer.instance}
-        Favorite.objects.create(**data)
-        ShoppingCart.objects.create(**data)
-        serializer.data['is_favorited'] = True
-        serializer.data['is_in_shopping_cart'] = True
+        for model in (Favorite, ShoppingCart):
+            add_user_recipes(
+                model, self.request.user, [serializer.instance.pk]
+            )
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return OutputRecipeSerializer
         return CreateRecipeSerializer
 
-    def get_queryset(self):
-        recipes = Recipe.objects.all()
-        user = self.request.user
-        if user.is_anonymous:
-            user = -1
-        shopping_cart = ShoppingCart.objects.filter(
-            recipe_id=OuterRef('pk'),
-            user=user
-        )
-        favorite = Favorite.objects.filter(
-            recipe_id=OuterRef('pk'),
-            user=user
-        )
+    def list(self, request, *args, **kwargs):
+        """
+        Первые страницы ?ordering=popular без других фильтров
+        берутся из таблицы лидеров.
+        """
+        params = request.query_params
+        if (params.get('ordering') == POPULAR
+                and set(params) <= {'ordering', 'page', 'limit'}):
+            page = self.paginate_queryset(
+                leaderboard.recipes(self.get_queryset())
+            )
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        return super().list(request, *args, **kwargs)
 
-        return recipes.annotate(
-            is_favorited=Exists(favorite),
-            is_in_shopping_cart=Exists(shopping_cart),
-        )
+    def get_queryset(self):
+        recipes = Recipe.objects.with_user_flags(self.request.user)
+        if self.request.method in SAFE_METHODS:
+            return recipes.for_output()
+        return recipes
 
     @action(
         ['post', 'delete'],
@@ -112,22 +148,107 @@ class RecipeViewSet(FullUpdateMixin,
             pk
         )
 
+    @action(
+        ['post', 'delete'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart'
+    )
+    def shopping_cart_bulk(self, request):
+        """
+        Добавить/удалить список рецептов из корзины.
+        DELETE без списка очищает корзину.
+        """
+        return bulk_post_delete_instances(
+            ShoppingCart, request, allow_clear=True
+        )
+
+    @action(
+        ['post', 'delete'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='favorite'
+    )
+    def favorite_bulk(self, request):
+        """Добавить/удалить список рецептов из избранного"""
+        return bulk_post_delete_instances(Favorite, request)
+
     @action(
         ['get'],
         detail=False,
-        permission_classes=[IsAuthenticated]
+        permission_classes=[IsAuthenticated],
+        renderer_classes=(TxtRenderer, CsvRenderer,
+                          JSONRenderer, MarkdownRenderer)
     )
     def download_shopping_cart(self, request):
-        """Скачать корзину"""
-        recipes = request.user.shopping_cart.values('recipe')
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in=recipes
+        """Скачать корзину: ?format=txt|csv|json|md"""
+        ingredients = request.user.shopping_list.annotate(
+            total_amount=F('amount')
         ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(
-            total_amount=Sum('amount')
+            'ingredient__name', 'ingredient__measurement_unit', 'total_amount'
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
+        return create_cart_file(
+            request,
+            ingredients.iterator(chunk_size=CART_ITERATOR_CHUNK_SIZE),
+            request.accepted_renderer.format
         )
-        return create_cart_txt(ingredients)
+
+    @action(
+        ['get'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        pagination_class=FeedCursorPagination
+    )
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь"""
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(['get'], detail=False, pagination_class=PageNumberAndLimit)
+    def pantry(self, request):
+        """
+        Рецепты, которые можно приготовить из имеющихся продуктов:
+        ?ingredients=<id>&ingredients=<id>... - имеющиеся ингредиенты,
+        ?missing= - сколько ингредиентов может не хватать (по умолчанию 0).
+        """
+        params = PantrySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        page = self.paginate_queryset(pantry_index.match(
+            params.validated_data['ingredients'],
+            params.validated_data['missing']
+        ))
+        matches = {
+            recipe_id: (coverage, missing)
+            for recipe_id, coverage, missing in page
+        }
+        recipes = self.get_queryset().in_bulk(matches)
+        serializer = PantryRecipeSerializer(
+            [recipes[pk] for pk in matches if pk in recipes],
+            many=True,
+            context={**self.get_serializer_context(), 'matches': matches}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(['get'], detail=True)
+    def similar(self, request, pk=None):
+        """
+        Похожие по составу ингредиентов рецепты,
+        ?limit= - количество (по умолчанию 6).
+        """
+        recipe = get_object_or_404(Recipe, pk=pk)
+        params = SimilarSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        scores = dict(
+            similar_recipes(recipe.pk, params.validated_data['limit'])
+        )
+        recipes = Recipe.objects.filter(pk__in=scores).only(
+            'id', 'name', 'image', 'cooking_time'
+        )
+        recipes = sorted(recipes, key=lambda item: (-scores[item.pk], item.pk))
+        return Response(SimilarRecipeSerializer(
+            recipes, many=True, context={'request': request, 'scores': scores}
+        ).data)
 
     @action(
         ['get'],
@@ -135,24 +256,12 @@ class RecipeViewSet(FullUpdateMixin,
         url_path='get-link'
     )
     def get_link(self, request, pk=None):
-        """Получить короткую ссылку на рецепт"""
-        absolute_uri = request.build_absolute_uri()
-        domain = absolute_uri.split('api/')[0]
-        short_link = domain + 's/' + shorten_url() + '/'
-        serializer = ShortUrlSerializer(data={'short_url': short_link})
-
-        if (serializer.is_valid(raise_exception=True)
-                and not ShortUrl.objects.filter(full_url=absolute_uri)
-                .exists()):
-
-            serializer.save(
-                full_url=absolute_uri,
-                short_url=short_link
-            )
-
-        else:
-            short_link = get_object_or_404(
-                ShortUrl,
-                full_url=absolute_uri
-            ).short_url
-        return Response({'short-link': short_link}, status=status.HTTP_200_OK)
+        """Получить короткую ссылку на рецепт (код выводится из id)"""
+        try:
+            code = encode(int(pk))
+        except ValueError:
+            raise Http404
+        return Response(
+            {'short-link': request.build_absolute_uri(f'/s/{code}/')},
+            status=status.HTTP_200_OK
+        )
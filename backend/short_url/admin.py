@@ -1,6 +1,7 @@
 from django.contrib import admin
+from django.db.models import Max, Sum
 
-from .models import ShortUrl
+from .models import ShortUrl, ShortUrlDailyStat
 
 
 @admin.register(ShortUrl)
@@ -10,8 +11,39 @@ class ShortUrlAdmin(admin.ModelAdmin):
         'full_url',
         'short_url',
         'created_at',
-        'is_active'
+        'is_active',
+        'hits',
+        'last_access',
     )
     search_fields = ('full_url', 'short_url')
     ordering = ('-created_at',)
     empty_value_display = 'Не задано'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            hits=Sum('stats__hits'),
+            last_access=Max('stats__last_access')
+        )
+
+    @admin.display(description='Переходов', ordering='hits')
+    def hits(self, obj):
+        return obj.hits or 0
+
+    @admin.display(description='Последний переход', ordering='last_access')
+    def last_access(self, obj):
+        return obj.last_access
+
+
+@admin.register(ShortUrlDailyStat)
+class ShortUrlDailyStatAdmin(admin.ModelAdmin):
+    """Статистика переходов по дням, только просмотр"""
+    list_display = ('code', 'day', 'hits', 'last_access')
+    list_filter = ('day',)
+    search_fields = ('code',)
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,61 @@
+"""
+Короткие коды рецептов без записи в базу.
+
+Id рецепта (32 бита) перемешивается сетью Фейстеля с ключом
+SHORT_LINK_KEY и записывается в base62 фиксированной длины
+SHORT_CODE_LENGTH, поэтому код обратим, а соседние id дают
+непохожие коды. Старые случайные коды (см. ShortUrl) короче.
+"""
+import hashlib
+
+from django.conf import settings
+from utils.constants import (SHORT_CODE_ALPHABET, SHORT_CODE_LENGTH,
+                             SHORT_CODE_ROUNDS)
+
+HALF_BITS = 16
+HALF_MASK = (1 << HALF_BITS) - 1
+MAX_ID = (1 << 2 * HALF_BITS) - 1
+BASE = len(SHORT_CODE_ALPHABET)
+DIGITS = {char: value for value, char in enumerate(SHORT_CODE_ALPHABET)}
+
+_key = hashlib.sha256(settings.SHORT_LINK_KEY.encode()).digest()
+
+
+def _round(number, value):
+    digest = hashlib.blake2b(
+        bytes((number,)) + value.to_bytes(2, 'big'),
+        key=_key, digest_size=2
+    ).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def encode(recipe_id):
+    """Возвращает короткий код рецепта"""
+    if not 0 < recipe_id <= MAX_ID:
+        raise ValueError(f'id рецепта вне диапазона: {recipe_id}')
+    left, right = recipe_id >> HALF_BITS, recipe_id & HALF_MASK
+    for number in range(SHORT_CODE_ROUNDS):
+        left, right = right, left ^ _round(number, right)
+    value = left << HALF_BITS | right
+    chars = []
+    for _ in range(SHORT_CODE_LENGTH):
+        value, digit = divmod(value, BASE)
+        chars.append(SHORT_CODE_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def decode(code):
+    """Возвращает id рецепта по коду или None, если код не наш"""
+    if len(code) != SHORT_CODE_LENGTH:
+        return None
+    value = 0
+    for char in code:
+        if char not in DIGITS:
+            return None
+        value = value * BASE + DIGITS[char]
+    if value > MAX_ID:
+        return None
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for number in reversed(range(SHORT_CODE_ROUNDS)):
+        left, right = right ^ _round(number, left), left
+    return (left << HALF_BITS | right) or None
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('short_url', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortUrlDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=16, verbose_name='Код')),
+                ('day', models.DateField(verbose_name='День')),
+                ('hits', models.PositiveBigIntegerField(default=0, verbose_name='Переходов')),
+                ('last_access', models.DateTimeField(verbose_name='Последний переход')),
+                ('short_url', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='short_url.shorturl', verbose_name='Короткая ссылка')),
+            ],
+            options={
+                'verbose_name': 'статистика ссылки за день',
+                'verbose_name_plural': 'Статистика переходов',
+                'ordering': ('-day', 'code'),
+                'default_related_name': 'stats',
+                'unique_together': {('code', 'day')},
+            },
+        ),
+    ]
@@ -25,3 +25,26 @@ class ShortUrl(models.Model):
 
     def __str__(self) -> str:
         return f'{self.full_url}'
+
+
+class ShortUrlDailyStat(models.Model):
+    """Переходы по короткой ссылке за день"""
+
+    code = models.CharField('Код', max_length=16)
+    short_url = models.ForeignKey(
+        ShortUrl, verbose_name='Короткая ссылка',
+        on_delete=models.CASCADE, null=True, blank=True
+    )
+    day = models.DateField('День')
+    hits = models.PositiveBigIntegerField('Переходов', default=0)
+    last_access = models.DateTimeField('Последний переход')
+
+    class Meta:
+        verbose_name = 'статистика ссылки за день'
+        verbose_name_plural = 'Статистика переходов'
+        default_related_name = 'stats'
+        ordering = ('-day', 'code')
+        unique_together = ('code', 'day')
+
+    def __str__(self) -> str:
+        return f'{self.code} {self.day}: {self.hits}'
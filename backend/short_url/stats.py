@@ -0,0 +1,129 @@
+"""
+Буферизованный учёт переходов по коротким ссылкам.
+
+Переходы копятся в памяти воркера по ключу (код, день) и сбрасываются
+в ShortUrlDailyStat одним INSERT ... ON CONFLICT DO UPDATE фоновым
+потоком каждые SHORT_URL_STATS_FLUSH_INTERVAL секунд (даже если новых
+переходов нет), запросом - при накоплении SHORT_URL_STATS_FLUSH_HITS
+переходов, а также при завершении воркера.
+При аварийном завершении теряется не больше этих переходов;
+непереданные из-за ошибки базы переходы пишутся в лог.
+"""
+import atexit
+import logging
+import os
+import threading
+from time import sleep
+
+from django.db import Error, close_old_connections, connection, transaction
+from django.utils import timezone
+from utils.constants import (SHORT_URL_STATS_FLUSH_HITS,
+                             SHORT_URL_STATS_FLUSH_INTERVAL)
+
+from .models import ShortUrl, ShortUrlDailyStat
+
+logger = logging.getLogger(__name__)
+
+
+def upsert_stats(rows):
+    """
+    Прибавляет переходы к дневной статистике.
+    rows - список (код, id ShortUrl или None, день, переходы, время).
+    Id ссылки, удалённой после попадания в кэш переходов, заменяется
+    на NULL, чтобы не нарушить внешний ключ всей пачки.
+    """
+    quote = connection.ops.quote_name
+    table = quote(ShortUrlDailyStat._meta.db_table)
+    short_urls = quote(ShortUrl._meta.db_table)
+    greatest = 'GREATEST' if connection.vendor == 'postgresql' else 'MAX'
+    placeholders = ', '.join([
+        f'(%s, (SELECT {quote("id")} FROM {short_urls} '
+        f'WHERE {quote("id")} = %s), %s, %s, %s)'
+    ] * len(rows))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({quote("code")}, {quote("short_url_id")}, '
+            f'{quote("day")}, {quote("hits")}, {quote("last_access")}) '
+            f'VALUES {placeholders} '
+            f'ON CONFLICT ({quote("code")}, {quote("day")}) DO UPDATE SET '
+            f'{quote("hits")} = {table}.{quote("hits")} + '
+            f'EXCLUDED.{quote("hits")}, '
+            f'{quote("last_access")} = {greatest}('
+            f'{table}.{quote("last_access")}, '
+            f'EXCLUDED.{quote("last_access")})',
+            [value for row in rows for value in row]
+        )
+
+
+class ClickBuffer:
+    """Счётчики переходов в памяти воркера"""
+
+    def __init__(self, interval=SHORT_URL_STATS_FLUSH_INTERVAL,
+                 max_hits=SHORT_URL_STATS_FLUSH_HITS):
+        self.interval = interval
+        self.max_hits = max_hits
+        self._counts = {}
+        self._pending = 0
+        self._timer_pid = None
+        self._lock = threading.Lock()
+
+    def add(self, code, short_url_id=None):
+        """
+        Учитывает переход; возвращает True, если накоплено
+        max_hits переходов и пора вызвать flush.
+        """
+        now = timezone.now()
+        key = (code, timezone.localdate(now))
+        with self._lock:
+            self._start_timer()
+            hits = self._counts.get(key, (None, 0))[1]
+            self._counts[key] = (short_url_id, hits + 1, now)
+            self._pending += 1
+            return self._pending >= self.max_hits
+
+    def _start_timer(self):
+        """
+        Запускает поток периодического сброса при первом переходе:
+        потоки не переживают fork, поэтому в каждом процессе свой.
+        """
+        if self._timer_pid == os.getpid():
+            return
+        self._timer_pid = os.getpid()
+        threading.Thread(
+            target=self._run, name='short-url-stats', daemon=True
+        ).start()
+
+    def _run(self):
+        while True:
+            sleep(self.interval)
+            if not self._pending:
+                continue
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception('Ошибка сброса переходов по коротким ссылкам')
+
+    def flush(self):
+        """Сбрасывает накопленные переходы в базу"""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            pending, self._pending = self._pending, 0
+        if not counts:
+            return 0
+        try:
+            upsert_stats([
+                (code, short_url_id, day, hits, last_access)
+                for (code, day), (short_url_id, hits, last_access)
+                in counts.items()
+            ])
+        except Error:
+            logger.exception(
+                'Не сохранено переходов по коротким ссылкам: %s', pending
+            )
+            return 0
+        return pending
+
+
+clicks = ClickBuffer()
+atexit.register(clicks.flush)
@@ -1,18 +1,155 @@
-from django.http import HttpResponseRedirect
-from django.shortcuts import get_object_or_404
-from rest_framework.views import APIView
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from time import monotonic
 
+from asgiref.sync import sync_to_async
+from django.http import (Http404, HttpResponseNotAllowed,
+                         HttpResponseRedirect)
+from django.views.decorators.http import require_GET
+from recipes.models import Recipe
+from utils.constants import (LEGACY_SHORT_URL_CACHE_SIZE,
+                             LEGACY_SHORT_URL_CACHE_TTL,
+                             SHORT_URL_RECIPE_CACHE_SIZE,
+                             SHORT_URL_RECIPE_CACHE_TTL)
+
+from .codes import decode
 from .models import ShortUrl
+from .stats import clicks
+
+
+class CachedLookup(ABC):
+    """
+    Результаты поиска в базе по ключу, LRU в памяти воркера.
+    Запись (включая отсутствующий объект) перечитывается
+    из базы через ttl секунд.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._items = OrderedDict()
+
+    @abstractmethod
+    def _lookup(self, key):
+        """Queryset, первая строка которого - результат поиска"""
+
+    def _convert(self, row):
+        """Значение для кэша по строке _lookup (None, если её нет)"""
+        return row
+
+    def _cached(self, short_url):
+        """Запись кэша, если она есть и не устарела, иначе None"""
+        cached = self._items.get(short_url)
+        if cached is None or monotonic() - cached[1] >= self.ttl:
+            return None
+        self._items.move_to_end(short_url)
+        return cached
+
+    def _remember(self, short_url, redirect):
+        self._items[short_url] = (redirect, monotonic())
+        self._items.move_to_end(short_url)
+        if len(self._items) > self.size:
+            self._items.popitem(last=False)
+        return redirect
+
+    def get(self, key):
+        cached = self._cached(key)
+        if cached is not None:
+            return cached[0]
+        return self._remember(key, self._convert(self._lookup(key).first()))
+
+    async def aget(self, key):
+        cached = self._cached(key)
+        if cached is not None:
+            return cached[0]
+        return self._remember(
+            key, self._convert(await self._lookup(key).afirst())
+        )
+
+
+class LegacyRedirects(CachedLookup):
+    """
+    Пары (id ShortUrl, адрес перехода) для старых (случайных) коротких
+    ссылок. Ссылки можно изменить или удалить в админке, поэтому
+    записи устаревают через LEGACY_SHORT_URL_CACHE_TTL секунд.
+    """
+
+    def __init__(self, size=LEGACY_SHORT_URL_CACHE_SIZE,
+                 ttl=LEGACY_SHORT_URL_CACHE_TTL):
+        super().__init__(size, ttl)
+
+    def _lookup(self, short_url):
+        return ShortUrl.objects.filter(
+            short_url=short_url
+        ).values_list('pk', 'full_url')
+
+    def _convert(self, legacy):
+        if legacy is None:
+            return None
+        pk, full_url = legacy
+        return pk, ''.join(full_url.split('get-link/')[0].split('api/'))
+
+
+class ExistingRecipes(CachedLookup):
+    """
+    Существует ли рецепт с id из короткого кода. Код декодируется
+    в id для многих случайных строк, переходы по ним не учитываются.
+    """
+
+    def __init__(self, size=SHORT_URL_RECIPE_CACHE_SIZE,
+                 ttl=SHORT_URL_RECIPE_CACHE_TTL):
+        super().__init__(size, ttl)
+
+    def _lookup(self, recipe_id):
+        return Recipe.objects.filter(pk=recipe_id).values_list(
+            'pk', flat=True
+        )
+
+    def _convert(self, pk):
+        return pk is not None
+
+
+legacy_redirects = LegacyRedirects()
+existing_recipes = ExistingRecipes()
+
 
+@require_GET
+def redirect_short_link(request, slug):
+    """Перенаправление по короткой ссылке без обращения к DRF"""
+    recipe_id = decode(slug)
+    if recipe_id is not None:
+        short_url_id = None
+        url = request.build_absolute_uri(f'/recipes/{recipe_id}/')
+        counted = existing_recipes.get(recipe_id)
+    else:
+        legacy = legacy_redirects.get(request.build_absolute_uri())
+        if legacy is None:
+            raise Http404
+        short_url_id, url = legacy
+        counted = True
+    if counted and clicks.add(slug, short_url_id):
+        clicks.flush()
+    return HttpResponseRedirect(url)
 
-class RedirectUrl(APIView):
-    """Представление для перенаправления пользователя по короткой ссылке"""
-    http_method_names = ['get']
 
-    def get(self, request, format=None, slug=None):
-        url = get_object_or_404(
-            ShortUrl,
-            short_url=request.build_absolute_uri()
-        ).full_url
-        url = ''.join(url.split('get-link/')[0].split('api/'))
-        return HttpResponseRedirect(redirect_to=url)
+async def aredirect_short_link(request, slug):
+    """
+    Асинхронный вариант redirect_short_link для ASGI
+    (require_GET в Django 4.2 не поддерживает async-представления).
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    recipe_id = decode(slug)
+    if recipe_id is not None:
+        short_url_id = None
+        url = request.build_absolute_uri(f'/recipes/{recipe_id}/')
+        counted = await existing_recipes.aget(recipe_id)
+    else:
+        legacy = await legacy_redirects.aget(request.build_absolute_uri())
+        if legacy is None:
+            raise Http404
+        short_url_id, url = legacy
+        counted = True
+    if counted and clicks.add(slug, short_url_id):
+        await sync_to_async(clicks.flush)()
+    return HttpResponseRedirect(url)
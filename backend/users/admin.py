@@ -4,7 +4,7 @@ from .models import CustomUser, Subscription
 
 
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('username', 'email')
+    list_display = ('username', 'email', 'recipes_count', 'followers_count')
     search_fields = ('email', 'username')
 
 
@@ -0,0 +1,18 @@
+from utils.loaders import RequestBatchLoader
+
+from .models import Subscription
+
+
+class SubscriptionLoader(RequestBatchLoader):
+    """Флаг is_subscribed текущего пользователя по id авторов"""
+
+    def load(self, keys):
+        user = self.request.user
+        if user.is_anonymous:
+            return dict.fromkeys(keys, False)
+        subscribed = set(
+            Subscription.objects.filter(
+                user=user, following_id__in=keys
+            ).values_list('following_id', flat=True)
+        )
+        return {key: key in subscribed for key in keys}
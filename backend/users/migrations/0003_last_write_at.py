@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='last_write_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последняя запись'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_last_write_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='user_recipes_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия избранного и корзины'),
+        ),
+    ]
@@ -1,8 +1,9 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from utils.counters import DenormalizedFieldsMixin
 
 
-class CustomUser(AbstractUser):
+class CustomUser(DenormalizedFieldsMixin, AbstractUser):
     email = models.EmailField(
         verbose_name='Адрес электронной почты',
         unique=True,
@@ -17,6 +18,18 @@ class CustomUser(AbstractUser):
         default=None
     )
     password = models.CharField('Пароль', max_length=128)
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False
+    )
+    user_recipes_version = models.PositiveIntegerField(
+        'Версия избранного и корзины', default=0, editable=False
+    )
+    last_write_at = models.DateTimeField(
+        'Последняя запись', null=True, blank=True, editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
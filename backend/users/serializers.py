@@ -1,14 +1,24 @@
 import recipes.serializers
 from django.contrib.auth import get_user_model
 from drf_extra_fields.fields import Base64ImageField
-from recipes.models import Recipe
 from rest_framework import serializers, status
+from users.loaders import SubscriptionLoader
 from users.models import Subscription
+from utils.loaders import LoaderListSerializer
+from utils.serializers import UpdateFieldsMixin
 
 User = get_user_model()
 
 
-class AvatarSerializer(serializers.ModelSerializer):
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он не задан"""
+    limit = request.GET.get('recipes_limit')
+    if limit and limit.isdigit():
+        return int(limit)
+    return None
+
+
+class AvatarSerializer(UpdateFieldsMixin, serializers.ModelSerializer):
     """Возвращает только значение поля avatar"""
     avatar = Base64ImageField()
 
@@ -24,7 +34,7 @@ class AvatarSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(UpdateFieldsMixin, serializers.ModelSerializer):
     """Cериализатор для пользователей"""
     avatar = Base64ImageField(allow_null=True)
     is_subscribed = serializers.SerializerMethodField()
@@ -36,14 +46,17 @@ class UserSerializer(serializers.ModelSerializer):
             'last_name', 'avatar', 'is_subscribed',
         )
         read_only_fields = ('is_subscribed',)
+        list_serializer_class = LoaderListSerializer
+
+    def prime_loaders(self, instances):
+        SubscriptionLoader.for_request(self.context.get('request')).prime(
+            obj.pk for obj in instances
+        )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if not user.is_anonymous:
-            return Subscription.objects.filter(
-                user=user, following=obj
-            ).exists()
-        return False
+        return SubscriptionLoader.for_request(
+            self.context.get('request')
+        ).get(obj.pk)
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -80,7 +93,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 class SubscriptionOutputSerializer(serializers.ModelSerializer):
     """Сериализатор для вывода подписок"""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -89,25 +102,17 @@ class SubscriptionOutputSerializer(serializers.ModelSerializer):
                   'last_name', 'recipes', 'recipes_count', 'is_subscribed')
 
     def get_recipes(self, obj):
-        limit = self.context.get('request').GET.get('recipes_limit')
-        if not limit:
-            self.context.get('request').POST.get('recipes_limit')
-        recipes_query = obj.recipes.all()
-        if limit:
-            recipes_query = recipes_query[:int(limit)]
+        recipes_query = getattr(obj, 'latest_recipes', None)
+        if recipes_query is None:
+            recipes_query = obj.recipes.all()
+            limit = get_recipes_limit(self.context.get('request'))
+            if limit is not None:
+                recipes_query = recipes_query[:limit]
         return recipes.serializers.RecipeShortSerializer(
             recipes_query, many=True, context=self.context
         ).data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(
-            author=obj.id
-        ).count()
-
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if not user.is_anonymous:
-            return Subscription.objects.filter(
-                user=user, following=obj
-            ).exists()
-        return False
+        return SubscriptionLoader.for_request(
+            self.context.get('request')
+        ).get(obj.pk)
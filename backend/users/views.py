@@ -1,17 +1,20 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
+from recipes.models import Recipe
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from utils.pagination import PageNumberAndLimit
 
+from .loaders import SubscriptionLoader
 from .mixins import PartialUpdateUserMixin
 from .models import Subscription
 from .serializers import (AvatarSerializer, SubscriptionSerializer,
-                          UserSerializer)
+                          UserSerializer, get_recipes_limit)
 
 User = get_user_model()
 
@@ -68,8 +71,21 @@ class CustomUserViewSet(PartialUpdateUserMixin,
         pagination_class=PageNumberAndLimit,
     )
     def subscriptions(self, request):
-        qs = Subscription.objects.all().filter(user=self.request.user)
+        qs = Subscription.objects.filter(
+            user=self.request.user
+        ).select_related('following').prefetch_related(
+            Prefetch(
+                'following__recipes',
+                queryset=Recipe.objects.latest_per_author(
+                    get_recipes_limit(request)
+                ),
+                to_attr='latest_recipes'
+            )
+        ).order_by('id')
         page = self.paginate_queryset(qs)
+        loader = SubscriptionLoader.for_request(request)
+        for subscription in page or ():
+            loader.set(subscription.following_id, True)
         if page:
             serializer = SubscriptionSerializer(
                 page,
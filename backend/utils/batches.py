@@ -0,0 +1,17 @@
+def keyset_batches(queryset, batch_size, field='pk'):
+    """
+    Значения поля field объектов queryset пачками по batch_size
+    по возрастанию: каждая пачка читается отдельным запросом
+    с условием field > последнего значения предыдущей пачки.
+    """
+    last = 0
+    while True:
+        values = list(
+            queryset.filter(**{f'{field}__gt': last})
+            .order_by(field)
+            .values_list(field, flat=True)[:batch_size]
+        )
+        if not values:
+            return
+        last = values[-1]
+        yield values
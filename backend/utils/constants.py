@@ -2,5 +2,65 @@
 WRONG_ID = -1
 
 # Short urls constants
-RANDOM_STRING_CHARS = "abcdefghijklmnopqrstuvwxyz0123456789"
-TOKEN_LENGTH = 5
+SHORT_CODE_ALPHABET = (
+    '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+)
+SHORT_CODE_LENGTH = 6
+SHORT_CODE_ROUNDS = 4
+LEGACY_SHORT_URL_CACHE_SIZE = 4096
+LEGACY_SHORT_URL_CACHE_TTL = 300
+SHORT_URL_RECIPE_CACHE_SIZE = 10000
+SHORT_URL_RECIPE_CACHE_TTL = 300
+SHORT_URL_STATS_FLUSH_INTERVAL = 10
+SHORT_URL_STATS_FLUSH_HITS = 1000
+
+# Bulk favorite/shopping cart requests
+MAX_BULK_RECIPES = 500
+
+# Shopping cart export
+CART_ITERATOR_CHUNK_SIZE = 2000
+CART_SPOOL_MAX_SIZE = 64 * 1024
+
+# Ingredient autocomplete
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_SEARCH_MAX_LIMIT = 500
+
+# Reference data (tags, ingredients) snapshots
+REFERENCE_VERSION_TTL = 10
+REFERENCE_CACHE_SIZE = 512
+
+# Tag bitmask of recipes: bits 0..62 of a signed BIGINT
+TAG_MASK_BITS = 63
+
+# Full-text recipe search (PostgreSQL text search configuration)
+SEARCH_CONFIG = 'russian'
+
+# Similar recipes (MinHash / LSH)
+MINHASH_SEED = 20241030
+MINHASH_BANDS = 20
+MINHASH_ROWS = 2
+SIMILAR_RECIPES_LIMIT = 6
+SIMILAR_MAX_CANDIDATES = 200
+
+# Pantry matching ("what can I cook")
+MAX_PANTRY_INGREDIENTS = 200
+PANTRY_MAX_MISSING = 10
+PANTRY_CHANGE_LOG_SIZE = 10000
+PANTRY_MAX_INCREMENTAL = 1000
+PANTRY_CHANGE_WINDOW = 1000
+
+# Popularity (time-decayed favorites/carts score)
+FAVORITE_POPULARITY_WEIGHT = 1.0
+CART_POPULARITY_WEIGHT = 0.5
+POPULARITY_HALF_LIFE_HOURS = 72
+POPULARITY_MIN_SCORE = 0.01
+POPULAR_LEADERBOARD_SIZE = 120
+POPULAR_LEADERBOARD_TTL = 60
+
+# Followed authors feed (fan-out-on-write timelines)
+FEED_TIMELINE_LENGTH = 500
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+
+# Per-user favorite/cart recipe ids kept in worker memory (LRU, users)
+USER_RECIPES_CACHE_SIZE = 10000
@@ -0,0 +1,46 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def change_counter(queryset, field, delta=1, **updates):
+    """
+    Атомарно изменяет поле-счётчик у объектов queryset на delta
+    одним UPDATE с F-выражением. Счётчик не опускается ниже нуля.
+    updates - выражения для других полей, записываемые тем же UPDATE.
+    """
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta}, **updates)
+
+
+def count_subquery(model, related_field):
+    """Подзапрос с количеством объектов model, ссылающихся на OuterRef"""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{related_field: OuterRef('pk')})
+            .order_by()
+            .values(related_field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0)
+    )
+
+
+class DenormalizedFieldsMixin:
+    """
+    Миксин модели с денормализованными полями (editable=False), которые
+    изменяются только UPDATE с F-выражениями, сигналами и SQL.
+    save() существующего объекта без update_fields записывает лишь
+    редактируемые поля и не возвращает устаревшие значения из памяти.
+    """
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if field.editable and not field.primary_key
+            ]
+        return super().save(*args, **kwargs)
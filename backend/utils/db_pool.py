@@ -0,0 +1,78 @@
+"""
+Статистика постоянных соединений с базой в воркере.
+
+Соединение открывается на поток воркера и переиспользуется между
+запросами до истечения CONN_MAX_AGE (см. DATABASES в settings);
+перед первым запросом после простоя оно проверяется
+(CONN_HEALTH_CHECKS). Счётчики:
+checkouts - запросы, выполнившие хотя бы один SQL-запрос;
+waits - из них те, кому пришлось открывать новое соединение;
+opened - всего открыто соединений (в том числе вне запросов);
+size - открытых соединений в воркере сейчас.
+"""
+import os
+import threading
+import weakref
+
+from django.core.signals import request_finished, request_started
+from django.db.backends.signals import connection_created
+
+
+class PoolStats:
+    """Счётчики соединений воркера"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.opened = 0
+        self._connections = weakref.WeakSet()
+        self._request = threading.local()
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """Подключает обработчики сигналов"""
+        connection_created.connect(self.connection_opened)
+        request_started.connect(self.request_started)
+        request_finished.connect(self.request_finished)
+
+    def _mark_used(self, execute, sql, params, many, context):
+        self._request.used = True
+        return execute(sql, params, many, context)
+
+    def connection_opened(self, sender, connection, **kwargs):
+        self._request.opened = True
+        with self._lock:
+            self.opened += 1
+            self._connections.add(connection)
+        if self._mark_used not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self._mark_used)
+
+    def request_started(self, **kwargs):
+        self._request.used = False
+        self._request.opened = False
+
+    def request_finished(self, **kwargs):
+        if not getattr(self._request, 'used', False):
+            return
+        with self._lock:
+            self.checkouts += 1
+            self.waits += self._request.opened
+
+    @property
+    def size(self):
+        return sum(
+            connection.connection is not None
+            for connection in list(self._connections)
+        )
+
+    def as_dict(self):
+        return {
+            'pid': os.getpid(),
+            'checkouts': self.checkouts,
+            'waits': self.waits,
+            'opened': self.opened,
+            'size': self.size,
+        }
+
+
+pool_stats = PoolStats()
@@ -0,0 +1,159 @@
+"""
+Чтение с реплик базы.
+
+Запросы на чтение (GET, HEAD, OPTIONS) читают со случайной реплики
+из settings.DATABASE_REPLICAS, остальное идёт в основную базу.
+Пользователь, который недавно что-то записал (CustomUser.last_write_at),
+читает из основной базы DATABASE_PRIMARY_STICKY_SECONDS секунд, чтобы
+не увидеть отстающую реплику (например, is_favorited). Токены и сессии
+всегда читаются из основной базы: по ним и загружается пользователь,
+поэтому проверка не стоит отдельного запроса.
+Запись замечается по выполненным в основной базе INSERT, UPDATE
+и DELETE, в том числе сырым SQL в обход роутера. Без реплик
+middleware отключается: закреплять пользователя не за чем.
+"""
+import random
+from contextvars import ContextVar
+from datetime import timedelta
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject, empty
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_ONLY_APPS = {'authtoken', 'sessions'}
+WRITE_STATEMENTS = {'INSERT', 'UPDATE', 'DELETE'}
+
+current_request = ContextVar('current_request', default=None)
+
+
+def mark_writes(execute, sql, params, many, context):
+    """Отмечает запрос, выполнивший запись в основную базу"""
+    request = current_request.get()
+    if (request is not None
+            and sql.lstrip()[:6].upper() in WRITE_STATEMENTS):
+        request.wrote_to_database = True
+    return execute(sql, params, many, context)
+
+
+def install_write_marker(connection, **kwargs):
+    """
+    Подключает mark_writes к соединению основной базы: при создании
+    соединения и в начале запроса, если соединение открыто раньше.
+    """
+    if (connection.alias == DEFAULT_DB_ALIAS
+            and mark_writes not in connection.execute_wrappers):
+        connection.execute_wrappers.append(mark_writes)
+
+
+def known_user(request):
+    """Пользователь запроса, если он уже загружен, иначе None"""
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return user
+
+
+def is_sticky(user):
+    """Читает ли пользователь из основной базы после своей записи"""
+    return (
+        user is not None
+        and user.is_authenticated
+        and user.last_write_at is not None
+        and timezone.now() - user.last_write_at < timedelta(
+            seconds=settings.DATABASE_PRIMARY_STICKY_SECONDS
+        )
+    )
+
+
+class ReplicaRouter:
+    """Роутер: чтение с реплик в безопасных запросах, запись в основную"""
+
+    def db_for_read(self, model, **hints):
+        request = current_request.get()
+        if (
+            request is None
+            or not settings.DATABASE_REPLICAS
+            or request.method not in SAFE_METHODS
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+            or is_sticky(known_user(request))
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Делает запрос доступным роутеру и после успешной записи
+    закрепляет пользователя за основной базой.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        connection_created.connect(install_write_marker)
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def writer(request, response):
+        """Пользователь, успешно записавший в базу, иначе None"""
+        user = known_user(request)
+        if (
+            getattr(request, 'wrote_to_database', False)
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        ):
+            return user
+        return None
+
+    @staticmethod
+    def stick(user):
+        user.last_write_at = timezone.now()
+        type(user).objects.filter(pk=user.pk).update(
+            last_write_at=user.last_write_at
+        )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        install_write_marker(connections[DEFAULT_DB_ALIAS])
+        token = current_request.set(request)
+        try:
+            response = self.get_response(request)
+            user = self.writer(request, response)
+            if user is not None:
+                self.stick(user)
+        finally:
+            current_request.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        token = current_request.set(request)
+        try:
+            response = await self.get_response(request)
+            user = self.writer(request, response)
+            if user is not None:
+                await sync_to_async(self.stick)(user)
+        finally:
+            current_request.reset(token)
+        return response
@@ -0,0 +1,64 @@
+from abc import ABC, abstractmethod
+
+from django.db.models.manager import BaseManager
+from rest_framework import serializers
+
+
+class RequestBatchLoader(ABC):
+    """
+    Базовый загрузчик значений по ключам в пределах одного запроса.
+    Ключи собираются через prime(), недостающие загружаются одним
+    запросом (метод load) и запоминаются до конца запроса.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.cache = {}
+        self.pending = set()
+
+    @classmethod
+    def for_request(cls, request):
+        """Возвращает загрузчик, общий для всего HTTP-запроса"""
+        http_request = getattr(request, '_request', request)
+        attribute = f'_{cls.__name__}'
+        loader = getattr(http_request, attribute, None)
+        if loader is None:
+            loader = cls(request)
+            setattr(http_request, attribute, loader)
+        return loader
+
+    @abstractmethod
+    def load(self, keys):
+        """Возвращает словарь {ключ: значение} для всех keys"""
+
+    def prime(self, keys):
+        self.pending.update(key for key in keys if key not in self.cache)
+
+    def set(self, key, value):
+        self.cache[key] = value
+        self.pending.discard(key)
+
+    def get(self, key):
+        if key not in self.cache:
+            self.pending.add(key)
+            self.flush()
+        return self.cache[key]
+
+    def flush(self):
+        keys, self.pending = self.pending - self.cache.keys(), set()
+        if keys:
+            self.cache.update(self.load(keys))
+
+
+class LoaderListSerializer(serializers.ListSerializer):
+    """
+    Перед сериализацией списка передаёт все объекты
+    в child.prime_loaders, чтобы загрузчики собрали ключи заранее.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, BaseManager):
+            data = data.all()
+        data = list(data)
+        self.child.prime_loaders(data)
+        return super().to_representation(data)
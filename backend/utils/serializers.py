@@ -0,0 +1,12 @@
+class UpdateFieldsMixin:
+    """
+    Миксин ModelSerializer: update() сохраняет только поля
+    из validated_data (save с update_fields), не перезаписывая
+    остальные столбцы строки значениями из памяти.
+    """
+
+    def update(self, instance, validated_data):
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
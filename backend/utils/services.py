@@ -1,72 +1,254 @@
-from django.http import HttpResponse
+import csv
+import hashlib
+import json
+from tempfile import SpooledTemporaryFile
+
+from django.db import connection, transaction
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
-from django.utils.crypto import get_random_string
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
 from recipes.models import Recipe
+from recipes.serializers import RecipeIdsSerializer
+from recipes.signals import user_recipes_changed
 from rest_framework import status
 from rest_framework.response import Response
-from utils.constants import RANDOM_STRING_CHARS, TOKEN_LENGTH
+from utils.constants import CART_SPOOL_MAX_SIZE
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+def _cart_item(item):
+    return (
+        item.get('ingredient__name'),
+        item.get('total_amount'),
+        item.get('ingredient__measurement_unit')
+    )
+
+
+def cart_txt(content):
+    separator = ''
+    for item in content:
+        name, amount, measurement_unit = _cart_item(item)
+        yield f'{separator}{name} -> {amount} {measurement_unit}'
+        separator = '\n'
+
+
+def cart_csv(content):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for item in content:
+        yield writer.writerow(_cart_item(item))
+
 
+def cart_json(content):
+    yield '['
+    separator = ''
+    for item in content:
+        name, amount, measurement_unit = _cart_item(item)
+        yield separator + json.dumps({
+            'name': name,
+            'amount': amount,
+            'measurement_unit': measurement_unit
+        }, ensure_ascii=False)
+        separator = ', '
+    yield ']'
+
+
+def cart_md(content):
+    yield '# Список покупок\n\n'
+    for item in content:
+        name, amount, measurement_unit = _cart_item(item)
+        yield f'- [ ] {name} — {amount} {measurement_unit}\n'
 
-def shorten_url() -> str:
-    """Возвращает случайную строку для короткой ссылки"""
-    return get_random_string(TOKEN_LENGTH, RANDOM_STRING_CHARS)
 
+CART_FORMATS = {
+    'txt': (cart_txt, 'text/plain; charset=utf-8'),
+    'csv': (cart_csv, 'text/csv; charset=utf-8'),
+    'json': (cart_json, 'application/json; charset=utf-8'),
+    'md': (cart_md, 'text/markdown; charset=utf-8'),
+}
 
-def create_cart_txt(content: list):
+
+def create_cart_file(request, content, file_format='txt'):
     """
-    Создаёт текстовый документ для корзины покупок.
-    Возвращает файл в режиме чтения.
+    Создаёт файл корзины покупок в формате file_format.
+    Строки content читаются потоком и по мере формирования пишутся
+    в буфер, который выгружается на диск после CART_SPOOL_MAX_SIZE,
+    поэтому память воркера не зависит от размера корзины.
+    По содержимому считаются ETag и Content-Length;
+    при совпадении If-None-Match возвращается 304.
     """
-    data = []
-    for item in content:
-        name = item.get('ingredient__name')
-        amount = item.get('total_amount')
-        measurement_unit = item.get('ingredient__measurement_unit')
-        data.append(f'{name} -> {amount} {measurement_unit}')
-    data = '\n'.join(data)
-
-    return HttpResponse(
-        data,
-        status=status.HTTP_200_OK,
-        headers={
-            'Content-Type': 'text/plain,charset=utf8',
-            'Content-Disposition': 'attachment; filename=shopping.txt'
+    exporter, content_type = CART_FORMATS[file_format]
+    digest = hashlib.sha256()
+    spool = SpooledTemporaryFile(max_size=CART_SPOOL_MAX_SIZE)
+    for chunk in exporter(content):
+        chunk = chunk.encode('utf-8')
+        digest.update(chunk)
+        spool.write(chunk)
+    etag = f'"{digest.hexdigest()[:32]}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        spool.seek(0)
+        response = FileResponse(
+            spool,
+            as_attachment=True,
+            filename=f'shopping.{file_format}',
+            content_type=content_type
+        )
+    else:
+        spool.close()
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def from_db_value(model, field_name, value):
+    """Значение поля модели из строки сырого SQL-запроса"""
+    column = model._meta.get_field(field_name).cached_col
+    for converter in connection.ops.get_db_converters(column):
+        value = converter(value, column, connection)
+    return value
+
+
+def add_user_recipes(model, user, recipe_ids) -> set:
+    """
+    Добавляет рецепты в избранное/корзину одним запросом
+    INSERT ... ON CONFLICT DO NOTHING. Несуществующие и уже добавленные
+    рецепты пропускаются. Возвращает множество добавленных id.
+    """
+    recipe_ids = list(set(recipe_ids))
+    if not recipe_ids:
+        return set()
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    added_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({quote("user_id")}, {quote("recipe_id")}, '
+            f'{quote("added_at")}) '
+            f'SELECT %s, {quote("id")}, %s '
+            f'FROM {quote(Recipe._meta.db_table)} '
+            f'WHERE {quote("id")} IN ({placeholders}) '
+            f'ON CONFLICT DO NOTHING RETURNING {quote("recipe_id")}',
+            [user.pk, added_at, *recipe_ids]
+        )
+        added = {row[0] for row in cursor.fetchall()}
+        if added:
+            user_recipes_changed.send(
+                sender=model, user_id=user.pk,
+                action='add', recipe_ids=added
+            )
+    return added
+
+
+def remove_user_recipes(model, user, recipe_ids=None) -> set:
+    """
+    Удаляет рецепты из избранного/корзины одним запросом DELETE.
+    Если recipe_ids не передан, удаляет все записи пользователя.
+    Возвращает множество удалённых id; время их добавления
+    передаётся получателям сигнала в added_at.
+    """
+    quote = connection.ops.quote_name
+    sql = (f'DELETE FROM {quote(model._meta.db_table)} '
+           f'WHERE {quote("user_id")} = %s')
+    params = [user.pk]
+    if recipe_ids is not None:
+        recipe_ids = list(set(recipe_ids))
+        if not recipe_ids:
+            return set()
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        sql += f' AND {quote("recipe_id")} IN ({placeholders})'
+        params += recipe_ids
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'{sql} RETURNING {quote("recipe_id")}, {quote("added_at")}',
+            params
+        )
+        added_at = {
+            recipe_id: from_db_value(model, 'added_at', value)
+            for recipe_id, value in cursor.fetchall()
         }
-    )
+        removed = set(added_at)
+        if removed:
+            user_recipes_changed.send(
+                sender=model, user_id=user.pk,
+                action='remove', recipe_ids=removed, added_at=added_at
+            )
+    return removed
 
 
 def post_delete_instance(serializer_cls, model, request, pk):
     """
     Функция для обработки запросов на
-    создание/уничтожение объектов корзины и избранного
+    создание/уничтожение объектов корзины и избранного.
+    Запись и удаление выполняются одним запросом,
+    проверка наличия рецепта - только при неудаче.
     """
-    recipe = get_object_or_404(
-        Recipe,
-        pk=pk
-    )
     user = request.user
+    try:
+        pk = int(pk)
+    except ValueError:
+        raise Http404
     if request.method == 'POST':
+        if not add_user_recipes(model, user, [pk]):
+            get_object_or_404(Recipe, pk=pk)
+            return Response(
+                {'detail': f'Рецепт уже есть в разделе '
+                           f'"{model._meta.verbose_name_plural}"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        recipe = Recipe.objects.only('name', 'image', 'cooking_time').get(
+            pk=pk
+        )
         serializer = serializer_cls(
-            data=request.data,
+            model(user=user, recipe=recipe),
             context={'recipe': recipe, 'request': request}
         )
-        if serializer.is_valid(raise_exception=True):
-            serializer.save(user=user, recipe=recipe)
-            return Response(
-                serializer.data,
-                status=status.HTTP_201_CREATED
-            )
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED
+        )
 
+    if not remove_user_recipes(model, user, [pk]):
+        get_object_or_404(Recipe, pk=pk)
         return Response(
-            serializer.errors,
+            {'detail': f'Рецепта нет в разделе '
+                       f'"{model._meta.verbose_name_plural}"'},
             status=status.HTTP_400_BAD_REQUEST
         )
+    return Response(status=status.HTTP_204_NO_CONTENT)
 
-    if not model.objects.filter(recipe=recipe, user=user).exists():
+
+def bulk_post_delete_instances(model, request, allow_clear=False):
+    """
+    Функция для обработки запросов на массовое добавление/удаление
+    рецептов из корзины и избранного. Принимает список id в поле
+    'recipes'; при allow_clear DELETE без списка очищает все записи.
+    """
+    serializer = RecipeIdsSerializer(
+        data=request.data,
+        partial=allow_clear and request.method == 'DELETE'
+    )
+    serializer.is_valid(raise_exception=True)
+    recipe_ids = serializer.validated_data.get('recipes')
+    if recipe_ids is None:
+        removed = remove_user_recipes(model, request.user)
         return Response(
-            {"detail": f"Рецепт не был в {model.__class__.__name__}"},
-            status=status.HTTP_400_BAD_REQUEST
+            {'removed': sorted(removed)}, status=status.HTTP_200_OK
         )
 
-    model.objects.filter(recipe=recipe, user=user).delete()
-    return Response(status=status.HTTP_204_NO_CONTENT)
+    if request.method == 'POST':
+        added = add_user_recipes(model, request.user, recipe_ids)
+        return Response(
+            {'added': sorted(added)}, status=status.HTTP_201_CREATED
+        )
+    removed = remove_user_recipes(model, request.user, recipe_ids)
+    return Response({'removed': sorted(removed)}, status=status.HTTP_200_OK)